@@ -1,10 +1,13 @@
 import os
 import pickle
+import sys
 
 import casadi as ca
 import errno
 import numpy as np
+from operator import itemgetter
 from casadi import sign, cos, acos, sin, sqrt, atan2
+from collections import OrderedDict
 from numpy import pi
 
 from giskardpy import logging
@@ -46,37 +49,63 @@ def is_symbol(expression):
     return expression.shape[0] * expression.shape[1] == 1
 
 
+# (f, shapes of the parameters) -> CompiledFunction, oldest entries are dropped once the limit is reached
+_compiled_functions = OrderedDict()
+_compiled_functions_limit = 256
+
+
+def _is_module_level_function(f):
+    """
+    lambdas, closures and partials are usually created per call and would get a new cache entry every time
+    :rtype: bool
+    """
+    module = sys.modules.get(getattr(f, u'__module__', None))
+    return getattr(module, getattr(f, u'__name__', u''), None) is f
+
+
 def compile_and_execute(f, params):
     input = []
-    symbol_params = []
-    symbol_params2 = []
+    shapes = []
 
     for i, param in enumerate(params):
         if isinstance(param, list):
             param = np.array(param)
         if isinstance(param, np.ndarray):
-            symbol_param = ca.SX.sym('m', *param.shape)
-            if len(param.shape) == 2:
-                l = param.shape[0] * param.shape[1]
-            else:
-                l = param.shape[0]
-
-            input.append(param.reshape((l, 1)))
-            symbol_params.append(symbol_param)
-            asdf = symbol_param.T.reshape((l, 1))
-            symbol_params2.extend(asdf[k] for k in range(l))
+            # row major, like the transposed and reshaped symbols below
+            input.append(param.ravel())
+            shapes.append(param.shape)
         else:
-            input.append(np.array([param], ndmin=2))
-            symbol_param = ca.SX.sym('s')
-            symbol_params.append(symbol_param)
-            symbol_params2.append(symbol_param)
-    fast_f = speed_up(f(*symbol_params), symbol_params2)
-    input = np.concatenate(input).T[0]
-    result = fast_f.call2(input)
+            input.append([param])
+            shapes.append(None)
+    key = (f, tuple(shapes))
+    try:
+        fast_f = _compiled_functions[key]
+    except KeyError:
+        symbol_params = []
+        symbol_params2 = []
+        for shape in shapes:
+            if shape is not None:
+                symbol_param = ca.SX.sym('m', *shape)
+                l = symbol_param.shape[0] * symbol_param.shape[1]
+                symbol_params.append(symbol_param)
+                asdf = symbol_param.T.reshape((l, 1))
+                symbol_params2.extend(asdf[k] for k in range(l))
+            else:
+                symbol_param = ca.SX.sym('s')
+                symbol_params.append(symbol_param)
+                symbol_params2.append(symbol_param)
+        fast_f = speed_up(f(*symbol_params), symbol_params2)
+        if _is_module_level_function(f):
+            while len(_compiled_functions) >= _compiled_functions_limit:
+                _compiled_functions.popitem(last=False)
+            _compiled_functions[key] = fast_f
+    input = np.concatenate(input)
+    # copied, the output buffer of a cached function is overwritten by the next call
+    result = fast_f.call2(input).copy()
     if result.shape[0] * result.shape[1] == 1:
         return result[0][0]
     elif result.shape[1] == 1:
-        return result.T[0]
+        return result[:, 0]
     elif result.shape[0] == 1:
         return result[0]
     else:
@@ -246,6 +275,16 @@ class CompiledFunction(object):
         self.buf, self.f_eval = fast_f.buffer()
         self.out = np.zeros(self.shape, order='F')
         self.buf.set_res(0, memoryview(self.out))
+        self.args = np.zeros(len(str_params))
+        self.buf.set_arg(0, memoryview(self.args))
+        self.constant = len(str_params) == 0
+        if self.constant:
+            # e.g. fks of chains without movable joints, their result never changes
+            self.f_eval()
+        else:
+            # gathers the parameter values from a dict in c, instead of a list comprehension
+            self.get_args = itemgetter(*str_params)
+        self._mapped_f = {}
 
     def __call__(self, **kwargs):
         filtered_args = [kwargs[k] for k in self.str_params]
@@ -257,15 +296,49 @@ class CompiledFunction(object):
         :type filtered_args: list
         :return:
         """
+        if not self.constant:
+            self.args[:] = filtered_args
+            self.f_eval()
+        return self.out
 
-        filtered_args = np.array(filtered_args, dtype=float)
-        self.buf.set_arg(0, memoryview(filtered_args))
-        self.f_eval()
+    def call_with_dict(self, values):
+        """
+        :param values: maps at least all of self.str_params to their values
+        :type values: dict
+        :return:
+        """
+        if not self.constant:
+            self.args[:] = self.get_args(values)
+            self.f_eval()
         return self.out
 
+    def call_batch(self, filtered_args):
+        """
+        Evaluates the function for many parameter sets with a single call of a mapped casadi function.
+        :param filtered_args: one row of parameter values per evaluation, columns ordered like self.str_params
+        :type filtered_args: np.ndarray
+        :return: array with shape (len(filtered_args),) + self.shape
+        :rtype: np.ndarray
+        """
+        batch_size = len(filtered_args)
+        if self.constant:
+            return np.tile(self.out, (batch_size, 1, 1))
+        if batch_size not in self._mapped_f:
+            self._mapped_f[batch_size] = self.fast_f.map(batch_size)
+        # the mapped function takes one column per evaluation and returns the results next to each other
+        out = np.array(self._mapped_f[batch_size](np.asarray(filtered_args, dtype=float).T))
+        return out.reshape(self.shape[0], batch_size, self.shape[1]).transpose(1, 0, 2)
 
-def speed_up(function, parameters, backend=u'clang'):
+
+def speed_up(function, parameters, backend=u'clang', cse=False):
+    """
+    :param cse: merge structurally equal subexpressions before compiling, e.g. for stacked fks with common chains.
+                ignored by casadi versions without ca.cse.
+    :type cse: bool
+    """
     str_params = [str(x) for x in parameters]
+    if cse and hasattr(ca, u'cse'):
+        function = ca.cse(function)
     try:
         f = ca.Function('f', [Matrix(parameters)], [ca.densify(function)])
     except:
@@ -285,7 +358,12 @@ def cross(u, v):
     :return: 1d Matrix. If u and v have length 4, it ignores the last entry and adds a zero to the result.
     :rtype: Matrix
     """
-    return ca.cross(u, v)
+    result = [u[1] * v[2] - u[2] * v[1],
+              u[2] * v[0] - u[0] * v[2],
+              u[0] * v[1] - u[1] * v[0]]
+    if u.shape[0] == 4:
+        result.append(0)
+    return Matrix(result)
 
 
 def vector3(x, y, z):
@@ -364,21 +442,17 @@ def rotation_matrix_from_rpy(roll, pitch, yaw):
     :return: 4x4 Matrix
     :rtype: Matrix
     """
-    # TODO don't split this into 3 matrices
-
-    rx = Matrix([[1, 0, 0, 0],
-                 [0, ca.cos(roll), -ca.sin(roll), 0],
-                 [0, ca.sin(roll), ca.cos(roll), 0],
-                 [0, 0, 0, 1]])
-    ry = Matrix([[ca.cos(pitch), 0, ca.sin(pitch), 0],
-                 [0, 1, 0, 0],
-                 [-ca.sin(pitch), 0, ca.cos(pitch), 0],
-                 [0, 0, 0, 1]])
-    rz = Matrix([[ca.cos(yaw), -ca.sin(yaw), 0, 0],
-                 [ca.sin(yaw), ca.cos(yaw), 0, 0],
-                 [0, 0, 1, 0],
-                 [0, 0, 0, 1]])
-    return dot(rz, ry, rx)
+    # rz * ry * rx multiplied out, saves building and multiplying 3 matrices
+    sr = ca.sin(roll)
+    cr = ca.cos(roll)
+    sp = ca.sin(pitch)
+    cp = ca.cos(pitch)
+    sy = ca.sin(yaw)
+    cy = ca.cos(yaw)
+    return Matrix([[cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr, 0],
+                   [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr, 0],
+                   [-sp, cp * sr, cp * cr, 0],
+                   [0, 0, 0, 1]])
 
 
 def rotation_matrix_from_axis_angle(axis, angle):
@@ -420,13 +494,20 @@ def rotation_matrix_from_quaternion(x, y, z, w):
     :return: 4x4 Matrix
     :rtype: Matrix
     """
+    # every product is built once, the off diagonal entries are sums of two of them times 2
     x2 = x * x
     y2 = y * y
     z2 = z * z
     w2 = w * w
-    return Matrix([[w2 + x2 - y2 - z2, 2 * x * y - 2 * w * z, 2 * x * z + 2 * w * y, 0],
-                   [2 * x * y + 2 * w * z, w2 - x2 + y2 - z2, 2 * y * z - 2 * w * x, 0],
-                   [2 * x * z - 2 * w * y, 2 * y * z + 2 * w * x, w2 - x2 - y2 + z2, 0],
+    xy = x * y
+    xz = x * z
+    yz = y * z
+    wx = w * x
+    wy = w * y
+    wz = w * z
+    return Matrix([[w2 + x2 - y2 - z2, 2 * (xy - wz), 2 * (xz + wy), 0],
+                   [2 * (xy + wz), w2 - x2 + y2 - z2, 2 * (yz - wx), 0],
+                   [2 * (xz - wy), 2 * (yz + wx), w2 - x2 - y2 + z2, 0],
                    [0, 0, 0, 1]])
 
 
@@ -455,7 +536,11 @@ def frame_rpy(x, y, z, roll, pitch, yaw):
     :return: 4x4 Matrix
     :rtype: Matrix
     """
-    return dot(translation3(x, y, z), rotation_matrix_from_rpy(roll, pitch, yaw))
+    r = rotation_matrix_from_rpy(roll, pitch, yaw)
+    r[0, 3] = x
+    r[1, 3] = y
+    r[2, 3] = z
+    return r
 
 
 def frame_quaternion(x, y, z, qx, qy, qz, qw):
@@ -545,9 +630,9 @@ def rotation_distance(a_R_b, a_R_c):
     :return: angle of axis angle representation of b_R_c
     :rtype: Union[float, Symbol]
     """
-    difference = dot(a_R_b.T, a_R_c)
-    # return axis_angle_from_matrix(difference)[1]
-    angle = (trace(difference[:3, :3]) - 1) / 2
+    # the trace of a_R_b.T * a_R_c is the sum of the entrywise product, the rest of the matrix product is not needed.
+    # the last row of a 4x4 rotation matrix is 0 below the rotation and doesn't contribute
+    angle = (Sum(entrywise_product(a_R_b[:3, :3], a_R_c[:3, :3])) - 1) / 2
     angle = Min(angle, 1)
     angle = Max(angle, -1)
     return acos(angle)
@@ -761,6 +846,45 @@ def quaternion_from_matrix(matrix):
     return q
 
 
+def quaternion_from_matrix_shepperd(matrix):
+    """
+    Shepperd's method, only the largest component is computed with sqrt from the diagonal, the others are computed
+    from the off diagonals divided by it. Results in a much smaller expression than quaternion_from_matrix.
+    :param matrix: 4x4 or 3x3 Matrix
+    :type matrix: Matrix
+    :return: 4x1 Matrix
+    :rtype: Matrix
+    """
+    if isinstance(matrix, np.ndarray):
+        M = Matrix(matrix.tolist())
+    else:
+        M = Matrix(matrix)
+    # 4*x^2, 4*y^2, 4*z^2 and 4*w^2, at least one of them is >= 1
+    tx = 1 + M[0, 0] - M[1, 1] - M[2, 2]
+    ty = 1 - M[0, 0] + M[1, 1] - M[2, 2]
+    tz = 1 - M[0, 0] - M[1, 1] + M[2, 2]
+    tw = 1 + M[0, 0] + M[1, 1] + M[2, 2]
+    # 4*w*x, 4*w*y, 4*w*z, 4*x*y, 4*x*z and 4*y*z
+    wx = M[2, 1] - M[1, 2]
+    wy = M[0, 2] - M[2, 0]
+    wz = M[1, 0] - M[0, 1]
+    xy = M[0, 1] + M[1, 0]
+    xz = M[0, 2] + M[2, 0]
+    yz = M[1, 2] + M[2, 1]
+    # the unused candidates may divide by 0, if_else doesn't propagate their inf or nan
+    rx = sqrt(Max(0, tx))
+    ry = sqrt(Max(0, ty))
+    rz = sqrt(Max(0, tz))
+    rw = sqrt(Max(0, tw))
+    q_x_largest = Matrix([0.5 * rx, xy * 0.5 / rx, xz * 0.5 / rx, wx * 0.5 / rx])
+    q_y_largest = Matrix([xy * 0.5 / ry, 0.5 * ry, yz * 0.5 / ry, wy * 0.5 / ry])
+    q_z_largest = Matrix([xz * 0.5 / rz, yz * 0.5 / rz, 0.5 * rz, wz * 0.5 / rz])
+    q_w_largest = Matrix([wx * 0.5 / rw, wy * 0.5 / rw, wz * 0.5 / rw, 0.5 * rw])
+    return ca.if_else(tw >= Max(tx, Max(ty, tz)), q_w_largest,
+                      ca.if_else(tx >= Max(ty, tz), q_x_largest,
+                                 ca.if_else(ty >= tz, q_y_largest, q_z_largest)))
+
+
 def quaternion_multiply(q1, q2):
     """
     :param q1: 4x1 Matrix
@@ -806,6 +930,26 @@ def quaternion_diff(q0, q1):
     return quaternion_multiply(quaternion_conjugate(q0), q1)
 
 
+def quaternion_rotate_vector(quaternion, vector):
+    """
+    Rotates vector with v + w * t + q_xyz x t, where t = 2 * q_xyz x v. Cheaper than building the rotation matrix of the
+    quaternion first, if only one vector is rotated.
+    :param quaternion: 4x1 Matrix, unit quaternion
+    :type quaternion: Matrix
+    :param vector: 3x1 or 4x1 Matrix
+    :type vector: Matrix
+    :return: 1d Matrix. If vector has length 4, it ignores the last entry and adds a zero to the result.
+    :rtype: Matrix
+    """
+    q_xyz = Matrix([quaternion[0], quaternion[1], quaternion[2]])
+    v = Matrix([vector[0], vector[1], vector[2]])
+    t = 2 * cross(q_xyz, v)
+    result = v + quaternion[3] * t + cross(q_xyz, t)
+    if vector.shape[0] == 4:
+        return Matrix([result[0], result[1], result[2], 0])
+    return result
+
+
 def cosine_distance(v0, v1):
     """
     cosine distance ranging from 0 to 2
@@ -917,8 +1061,17 @@ def slerp(v1, v2, t):
 
 
 
+def vstack(list_of_matrices):
+    """
+    :type list_of_matrices: list
+    :return: all matrices stacked on top of each other
+    :rtype: Matrix
+    """
+    return ca.vertcat(*list_of_matrices)
+
+
 def to_numpy(matrix):
-    return np.array(matrix.tolist()).astype(float).reshape(matrix.shape)
+    return np.array(matrix.tolist(), dtype=float).reshape(matrix.shape)
 
 
 def save_division(nominator, denominator, if_nan=0):
@@ -2,7 +2,7 @@ from collections import OrderedDict, defaultdict, namedtuple
 
 import numpy as np
 from sortedcontainers import SortedKeyList
-from giskardpy.tfwrapper import kdl_to_np, np_vector, np_point
+from giskardpy.tfwrapper import kdl_to_np
 
 SoftConstraint = namedtuple(u'SoftConstraint', [u'lbA', u'ubA',
                                                 u'weight', u'expression', u'goal_constraint',
@@ -171,6 +171,7 @@ class Collisions(object):
         self.root_T_map = kdl_to_np(self.robot.root_T_map)
         self.robot_root = self.robot.get_root()
         self.collision_list_size = collision_list_size
+        self._link_T_map = {}
 
         # @profile
         def sort(x):
@@ -221,6 +222,19 @@ class Collisions(object):
 
 
 
+    def get_link_T_map(self, link_name):
+        """
+        root_T_map doesn't change during the lifetime of this object, it gets multiplied into the fk only once per link
+        :type link_name: str
+        :rtype: np.ndarray
+        """
+        try:
+            return self._link_T_map[link_name]
+        except KeyError:
+            link_T_map = np.dot(self.robot.get_fk_np(link_name, self.robot_root), self.root_T_map)
+            self._link_T_map[link_name] = link_T_map
+            return link_T_map
+
     def transform_closest_point(self, collision):
         """
         :type collision: Collision
@@ -244,20 +258,19 @@ class Collisions(object):
             collision = collision.reverse()
             new_link_a, new_link_b = new_link_b, new_link_a
 
-        new_b_T_r = self.robot.get_fk_np(new_link_b, self.robot_root)
-        new_a_T_r = self.robot.get_fk_np(new_link_a, self.robot_root)
         collision.set_link_a(new_link_a)
         collision.set_link_b(new_link_b)
 
-        new_b_T_map = np.dot(new_b_T_r, self.root_T_map)
+        new_a_T_map = self.get_link_T_map(new_link_a)
+        new_b_T_map = self.get_link_T_map(new_link_b)
 
-        new_a_P_pa = np.dot(np.dot(new_a_T_r, self.root_T_map), np_point(*collision.get_position_on_a_in_map()))
-        new_b_P_pb = np.dot(new_b_T_map, np_point(*collision.get_position_on_b_in_map()))
-        # r_P_pb = np.dot(self.root_T_map, np_point(*closest_point.position_on_b))
-        new_b_V_n = np.dot(new_b_T_map, np_vector(*collision.get_contact_normal_in_map()))
-        collision.set_position_on_a_in_a(new_a_P_pa[:-1])
-        collision.set_position_on_b_in_b(new_b_P_pb[:-1])
-        collision.set_contact_normal_in_b(new_b_V_n[:-1])
+        # R*p+t and R*n instead of dots with homogeneous 4d points and vectors
+        new_a_P_pa = np.dot(new_a_T_map[:3, :3], collision.get_position_on_a_in_map()) + new_a_T_map[:3, 3]
+        new_b_P_pb = np.dot(new_b_T_map[:3, :3], collision.get_position_on_b_in_map()) + new_b_T_map[:3, 3]
+        new_b_V_n = np.dot(new_b_T_map[:3, :3], collision.get_contact_normal_in_map())
+        collision.set_position_on_a_in_a(new_a_P_pa)
+        collision.set_position_on_b_in_b(new_b_P_pb)
+        collision.set_contact_normal_in_b(new_b_V_n)
         return collision
 
 
@@ -268,15 +281,16 @@ class Collisions(object):
         """
         movable_joint = self.robot.get_controlled_parent_joint(collision.get_original_link_a())
         new_a = self.robot.get_child_link_of_joint(movable_joint)
-        new_a_T_r = self.robot.get_fk_np(new_a, self.robot_root)
         collision.set_link_a(new_a)
 
-        new_a_P_pa = np.dot(np.dot(new_a_T_r, self.root_T_map), np_point(*collision.get_position_on_a_in_map()))
-        r_P_pb = np.dot(self.root_T_map, np_point(*collision.get_position_on_b_in_map()))
-        r_V_n = np.dot(self.root_T_map, np_vector(*collision.get_contact_normal_in_map()))
-        collision.set_position_on_a_in_a(new_a_P_pa[:-1])
-        collision.set_position_on_b_in_root(r_P_pb[:-1])
-        collision.set_contact_normal_in_root(r_V_n[:-1])
+        new_a_T_map = self.get_link_T_map(new_a)
+
+        new_a_P_pa = np.dot(new_a_T_map[:3, :3], collision.get_position_on_a_in_map()) + new_a_T_map[:3, 3]
+        r_P_pb = np.dot(self.root_T_map[:3, :3], collision.get_position_on_b_in_map()) + self.root_T_map[:3, 3]
+        r_V_n = np.dot(self.root_T_map[:3, :3], collision.get_contact_normal_in_map())
+        collision.set_position_on_a_in_a(new_a_P_pa)
+        collision.set_position_on_b_in_root(r_P_pb)
+        collision.set_contact_normal_in_root(r_V_n)
         return collision
 
 
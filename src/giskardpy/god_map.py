@@ -1,6 +1,6 @@
 import copy
 from copy import copy
-from multiprocessing import Lock
+from threading import Lock
 
 from giskardpy import casadi_wrapper as w
 
@@ -271,6 +271,30 @@ class GodMap(object):
             # return {expr: self.get_data(self.expr_to_key[expr]) for expr in exprs}
             return [self.unsafe_get_data(self.expr_to_key[expr]) for expr in symbols]
 
+    def make_values_getter(self, symbols):
+        """
+        Specializes get_values for one list of symbols, e.g. the parameters of a compiled function that gets
+        evaluated on every tick. Their identifiers are looked up only once and the shortcuts are called directly.
+        :type symbols: list
+        :return: function without parameters that returns the same as get_values(symbols)
+        """
+        keys = [self.expr_to_key[expr] for expr in symbols]
+
+        def get_values():
+            with self.lock:
+                shortcuts = self.shortcuts
+                data = self._data
+                values = []
+                for key in keys:
+                    shortcut = shortcuts.get(key)
+                    if shortcut is None:
+                        values.append(self.unsafe_get_data(key))
+                    else:
+                        values.append(shortcut.c(data))
+                return values
+
+        return get_values
+
     def get_registered_symbols(self):
         """
         :rtype: list
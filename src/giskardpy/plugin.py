@@ -1,3 +1,4 @@
+import gc
 import traceback
 from collections import OrderedDict
 from multiprocessing import Lock
@@ -74,6 +75,7 @@ class PluginBehavior(GiskardBehavior):
 
     def __init__(self, name, sleep=.5):
         self._plugins = OrderedDict()
+        self._plugins_tuple = ()  # snapshot of self._plugins.items() for the plugin loop
         self.set_status(Status.INVALID)
         self.status_lock = RLock()
         self.sleep = sleep
@@ -94,10 +96,12 @@ class PluginBehavior(GiskardBehavior):
             raise KeyError(u'A plugin with name "{}" already exists.'.format(name))
         with self.status_lock:
             self._plugins[name] = plugin
+            self._plugins_tuple = tuple(self._plugins.items())
 
     def remove_plugin(self, plugin_name):
         with self.status_lock:
             del self._plugins[plugin_name]
+            self._plugins_tuple = tuple(self._plugins.items())
 
     def setup(self, timeout):
         self.start_plugins()
@@ -139,19 +143,23 @@ class PluginBehavior(GiskardBehavior):
             plugin.stop()
 
     def update(self):
-        with self.status_lock:
-            if not self.update_thread.is_alive():
-                return Status.SUCCESS
-            return self.my_status
+        # don't take status_lock here, the plugin thread holds it while a plugin is ticking and the tree would stall
+        # until e.g. the qp is solved. my_status is only rebound, so reading it is safe.
+        if not self.update_thread.is_alive():
+            return Status.SUCCESS
+        return self.my_status
 
     def set_status(self, new_state):
         self.my_status = new_state
 
     def loop_over_plugins(self):
+        # the cyclic gc would otherwise pause the loop at random ticks, it is enabled again once the loop is done
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
         try:
             # self.init_plugins()
             while self.is_running() and not rospy.is_shutdown():
-                for plugin_name, plugin in self._plugins.items():
+                for plugin_name, plugin in self._plugins_tuple:
                     with self.status_lock:
                         if not self.is_running():
                             return
@@ -167,6 +175,9 @@ class PluginBehavior(GiskardBehavior):
             traceback.print_exc()
             # TODO make 'exception' string a parameter somewhere
             Blackboard().set('exception', e)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
 
 
 class SuccessPlugin(GiskardBehavior):
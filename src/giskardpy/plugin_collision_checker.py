@@ -78,6 +78,15 @@ class CollisionChecker(GiskardBehavior):
 
         self.collision_matrix = self.get_world().collision_goals_to_collision_matrix(deepcopy(collision_goals), max_distances)
 
+        # collisions are transformed into the parent or child links of controlled joints, compile all of those fks
+        # into one function before the first tick, otherwise the parent links would fall back to one function per fk
+        robot = self.get_robot()
+        links = set()
+        for joint_name in robot.controlled_joints:
+            links.add(robot.get_parent_link_of_joint(joint_name))
+            links.add(robot.get_child_link_of_joint(joint_name))
+        robot.compile_fks((link_name, robot.get_root()) for link_name in links)
+
         self.collision_list_size = self.get_god_map().get_data(identifier.external_collision_avoidance_repeller)
         self.collision_list_size = max(self.collision_list_size,
                                        self.get_god_map().get_data(identifier.external_collision_avoidance_repeller_eef))
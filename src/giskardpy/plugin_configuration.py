@@ -32,7 +32,8 @@ class ConfigurationPlugin(GiskardBehavior):
         self.lock = Queue(maxsize=1)
 
     def setup(self, timeout=0.0):
-        self.joint_state_sub = rospy.Subscriber(self.joint_state_topic, JointState, self.cb, queue_size=1)
+        self.joint_state_sub = rospy.Subscriber(self.joint_state_topic, JointState, self.cb, queue_size=1,
+                                                tcp_nodelay=True)
         return super(ConfigurationPlugin, self).setup(timeout)
 
     def cb(self, data):
@@ -18,19 +18,23 @@ def make_velocity_threshold(god_map,
     joint_convergence_threshold = god_map.get_data(identifier.joint_convergence_threshold)
     robot = god_map.get_data(identifier.robot)
     sample_period = god_map.get_data(identifier.sample_period)
-    thresholds = []
-    for joint_name in robot.controlled_joints:
-        velocity_limit = robot.get_joint_velocity_limit_expr_evaluated(joint_name, god_map)
-        if velocity_limit is None:
-            velocity_limit = 1
-        velocity_limit *= joint_convergence_threshold
+    velocity_limits = []
+    lower_cut_offs = []
+    upper_cut_offs = []
+    for joint_name, velocity_limit in zip(robot.controlled_joints,
+                                          robot.get_joint_velocity_limits_expr_evaluated(god_map)):
+        velocity_limits.append(velocity_limit)
         if robot.is_joint_prismatic(joint_name):
-            velocity_limit = min(max(min_translation_cut_off, velocity_limit), max_translation_cut_off)
+            lower_cut_offs.append(min_translation_cut_off)
+            upper_cut_offs.append(max_translation_cut_off)
         elif robot.is_joint_rotational(joint_name):
-            velocity_limit = min(max(min_rotation_cut_off, velocity_limit), max_rotation_cut_off)
-        velocity_limit *= sample_period
-        thresholds.append(velocity_limit)
-    return np.array(thresholds)
+            lower_cut_offs.append(min_rotation_cut_off)
+            upper_cut_offs.append(max_rotation_cut_off)
+        else:
+            lower_cut_offs.append(-np.inf)
+            upper_cut_offs.append(np.inf)
+    velocity_limits = np.array(velocity_limits, dtype=float) * joint_convergence_threshold
+    return np.clip(velocity_limits, lower_cut_offs, upper_cut_offs) * sample_period
 
 
 class GoalReachedPlugin(GiskardBehavior):
@@ -63,6 +63,7 @@ class ControllerPlugin(GiskardBehavior):
                                            self.joint_constraints,
                                            self.hard_constraints)
         self.controller.compile()
+        self.get_expr_values = self.get_god_map().make_values_getter(self.controller.get_expr())
 
         self.qp_data[identifier.weight_keys[-1]], \
         self.qp_data[identifier.b_keys[-1]], \
@@ -72,8 +73,7 @@ class ControllerPlugin(GiskardBehavior):
     @profile
     def update(self):
 
-        expr = self.controller.get_expr()
-        expr = self.god_map.get_values(expr)
+        expr = self.get_expr_values()
 
         next_cmd, \
         self.qp_data[identifier.H[-1]], \
@@ -1,4 +1,3 @@
-import matplotlib.pyplot as plt
 import numpy as np
 from py_trees import Status
 
@@ -28,9 +27,10 @@ class WiggleCancel(GiskardBehavior):
         self.keys = []
         self.thresholds = []
         self.velocity_limits = []
-        for joint_name, threshold in zip(self.get_robot().controlled_joints,
-                                         make_velocity_threshold(self.get_god_map())):
-            velocity_limit = self.get_robot().get_joint_velocity_limit_expr_evaluated(joint_name, self.god_map)
+        for joint_name, threshold, velocity_limit in zip(self.get_robot().controlled_joints,
+                                                         make_velocity_threshold(self.get_god_map()),
+                                                         self.get_robot().get_joint_velocity_limits_expr_evaluated(
+                                                             self.god_map)):
             if self.get_robot().is_joint_prismatic(joint_name):
                 velocity_limit = min(self.max_linear_velocity, velocity_limit)
             else:
@@ -42,25 +42,26 @@ class WiggleCancel(GiskardBehavior):
         self.key_set = set(self.keys)
         self.thresholds = np.array(self.thresholds)
         self.velocity_limits = np.array(self.velocity_limits)
-        self.js_samples = [[] for _ in range(len(self.keys))]
+        # joint x sample window of the latest velocities, oldest sample first
+        self.js_samples = np.zeros((len(self.keys), self.num_samples_in_fft))
+        self.number_of_js_samples = 0
 
     def update(self):
         latest_points = self.get_god_map().get_data(identifier.joint_states)
+        velocities = [latest_points[key].velocity for key in self.keys]
 
-        for i, key in enumerate(self.keys):
-            self.js_samples[i].append(latest_points[key].velocity)
+        if self.number_of_js_samples < self.num_samples_in_fft:
+            self.js_samples[:, self.number_of_js_samples] = velocities
+            self.number_of_js_samples += 1
+            if self.number_of_js_samples < self.num_samples_in_fft:
+                return Status.RUNNING
+        else:
+            self.js_samples[:, :-1] = self.js_samples[:, 1:]
+            self.js_samples[:, -1] = velocities
 
-        if len(self.js_samples[0]) < self.num_samples_in_fft:
-            return Status.RUNNING
-
-        if len(self.js_samples[0]) > self.num_samples_in_fft:
-            for i in range(len(self.js_samples)):
-                self.js_samples[i].pop(0)
-
-        js_samples_array = np.array(self.js_samples)
         plot = False
         try:
-            self.detect_shaking(js_samples_array, self.sample_period, self.min_wiggle_frequency,
+            self.detect_shaking(self.js_samples, self.sample_period, self.min_wiggle_frequency,
                                 self.amplitude_threshold, self.thresholds, self.velocity_limits, plot)
         except ShakingException as e:
             if self.get_god_map().get_data(identifier.cut_off_shaking):
@@ -105,6 +106,7 @@ class WiggleCancel(GiskardBehavior):
         fft = np.fft.rfft(joints_filtered, axis=1)
         fft = [2.0 * np.abs(i)/N for i in fft]
         if plot:
+            import matplotlib.pyplot as plt
             y = joints_filtered
 
             x = np.linspace(0, N * sample_period, N)
@@ -24,21 +24,20 @@ class KinSimPlugin(GiskardBehavior):
 
     @profile
     def update(self):
-        motor_commands = self.get_god_map().get_data(identifier.cmd)
-        current_js = self.get_god_map().get_data(identifier.joint_states)
-        next_js = None
-        if motor_commands:
-            next_js = OrderedDict()
-            for joint_name, sjs in current_js.items():
-                if joint_name in motor_commands:
-                    cmd = motor_commands[joint_name]
-                else:
-                    cmd = 0.0
-                next_js[joint_name] = SingleJointState(sjs.name, sjs.position + cmd,
-                                                            velocity=cmd/self.sample_period)
-        if next_js is not None:
-            self.get_god_map().set_data(identifier.joint_states, next_js)
-        else:
-            self.get_god_map().set_data(identifier.joint_states, current_js)
-        self.get_god_map().set_data(identifier.last_joint_states, current_js)
+        # one lock for all accesses, the commands and joint states are read and written as one consistent step
+        with self.get_god_map() as god_map:
+            motor_commands = god_map.unsafe_get_data(identifier.cmd)
+            current_js = god_map.unsafe_get_data(identifier.joint_states)
+            next_js = None
+            if motor_commands:
+                next_js = OrderedDict()
+                frequency = 1. / self.sample_period
+                for joint_name, sjs in current_js.items():
+                    cmd = motor_commands.get(joint_name, 0.0)
+                    next_js[joint_name] = SingleJointState(sjs.name, sjs.position + cmd, velocity=cmd * frequency)
+            if next_js is not None:
+                god_map.unsafe_set_data(identifier.joint_states, next_js)
+            else:
+                god_map.unsafe_set_data(identifier.joint_states, current_js)
+            god_map.unsafe_set_data(identifier.last_joint_states, current_js)
         return Status.RUNNING
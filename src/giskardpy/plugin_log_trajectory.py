@@ -6,9 +6,11 @@ from giskardpy.plugin import GiskardBehavior
 
 class LogTrajPlugin(GiskardBehavior):
     def update(self):
-        current_js = self.get_god_map().get_data(identifier.joint_states)
-        time = self.get_god_map().get_data(identifier.time)
-        trajectory = self.get_god_map().get_data(identifier.trajectory)
-        trajectory.set(time, current_js)
-        self.get_god_map().set_data(identifier.trajectory, trajectory)
+        # one lock for all accesses, instead of one per get_data and set_data
+        with self.get_god_map() as god_map:
+            current_js = god_map.unsafe_get_data(identifier.joint_states)
+            time = god_map.unsafe_get_data(identifier.time)
+            trajectory = god_map.unsafe_get_data(identifier.trajectory)
+            trajectory.set(time, current_js)
+            god_map.unsafe_set_data(identifier.trajectory, trajectory)
         return Status.RUNNING
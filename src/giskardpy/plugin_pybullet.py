@@ -316,7 +316,7 @@ class WorldUpdatePlugin(GiskardBehavior):
         if world_body.joint_state_topic:
             callback = (lambda msg: self.object_js_cb(world_body.name, msg))
             self.object_js_subs[world_body.name] = \
-                rospy.Subscriber(world_body.joint_state_topic, JointState, callback, queue_size=1)
+                rospy.Subscriber(world_body.joint_state_topic, JointState, callback, queue_size=1, tcp_nodelay=True)
             rospy.sleep(0.1)
 
     def detach_object(self, req):
@@ -1,11 +1,12 @@
 import hashlib
 
+import numpy as np
 import py_trees
 import rospy
 from visualization_msgs.msg import Marker, MarkerArray
 
 from giskardpy.plugin import GiskardBehavior
-from giskardpy.tfwrapper import pose_to_kdl, kdl_to_pose
+from giskardpy.utils import homo_matrix_to_pose
 
 class VisualizationBehavior(GiskardBehavior):
     def __init__(self, name, ensure_publish=False):
@@ -22,9 +23,10 @@ class VisualizationBehavior(GiskardBehavior):
         markers = []
         time_stamp = rospy.Time()
         robot = self.get_robot()
-        get_fk = robot.get_fk_pose
         links = [x for x in self.get_robot().get_link_names() if robot.has_link_visuals(x)]
-        for i, link_name in enumerate(links):
+        # evaluates the fks of all links with one call
+        fks = robot.get_fks_np(tuple((self.robot_base, link_name) for link_name in links))
+        for link_name, fk in zip(links, fks):
             marker = robot.link_as_marker(link_name)
             if marker is None:
                 continue
@@ -37,12 +39,10 @@ class VisualizationBehavior(GiskardBehavior):
             marker.ns = u'planning_visualization'
             marker.header.stamp = time_stamp
 
-            fk = get_fk(self.robot_base, link_name).pose
-
+            # the visual offset is applied to the matrix, converting to a pose only once
             if robot.has_non_identity_visual_offset(link_name):
-                marker.pose = kdl_to_pose(pose_to_kdl(fk) * pose_to_kdl(marker.pose))
-            else:
-                marker.pose = fk
+                fk = np.dot(fk, robot.get_visual_offset_np(link_name))
+            marker.pose = homo_matrix_to_pose(fk)
             markers.append(marker)
 
         self.publisher.publish(markers)
@@ -1,4 +1,3 @@
-from collections import OrderedDict
 from time import time
 
 import numpy as np
@@ -249,13 +248,13 @@ class QProblemBuilder(object):
 
     def filter_zero_weight_constraints(self, H, A, lb, ub, lbA, ubA, g):
         bA_mask, b_mask = make_filter_masks(H, self.num_joint_constraints, self.num_hard_constraints)
-        A = A[bA_mask][:, b_mask].copy()
+        A = A[np.ix_(bA_mask, b_mask)]
         lbA = lbA[bA_mask]
         ubA = ubA[bA_mask]
         lb = lb[b_mask]
         ub = ub[b_mask]
         g = g[b_mask]
-        H = H[b_mask][:, b_mask]
+        H = H[np.ix_(b_mask, b_mask)]
         return H, A, lb, ub, lbA, ubA, g
 
     @profile
@@ -264,8 +263,8 @@ class QProblemBuilder(object):
         Uses substitutions for each symbol to compute the next commands for each joint.
         :param substitutions:
         :type substitutions: list
-        :return: joint name -> joint command
-        :rtype: dict
+        :return: joint commands in the order of self.controlled_joints
+        :rtype: np.ndarray
         """
         np_big_ass_M = self.compiled_big_ass_M.call2(substitutions)
         np_H = np_big_ass_M[self.shape1:, :-3].copy()
@@ -300,10 +299,7 @@ class QProblemBuilder(object):
             raise e
         if xdot_full is None:
             return None
-        # TODO enable debug print in an elegant way, preferably without slowing anything down
-        self.debug_print(np_H, A, lb, ub, lbA, ubA, g, xdot_full)
-        return OrderedDict((observable, xdot_full[i]) for i, observable in enumerate(self.controlled_joints)), \
-               np_H, np_A, np_lb, np_ub, np_lbA, np_ubA, xdot_full
+        return xdot_full[:len(self.controlled_joints)], np_H, np_A, np_lb, np_ub, np_lbA, np_ubA, xdot_full
 
 def print_pd_dfs(dfs, names):
     import pandas as pd
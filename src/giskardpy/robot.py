@@ -1,8 +1,9 @@
 from __future__ import division
 import traceback
 from collections import namedtuple, OrderedDict, defaultdict
-from copy import deepcopy
 from itertools import combinations
+
+import numpy as np
 from giskardpy import identifier
 from geometry_msgs.msg import PoseStamped
 
@@ -32,9 +33,15 @@ class Robot(Backend):
         """
         self._fk_expressions = {}
         self._fks = {}
+        self._stacked_fks = {}
+        self._fused_fks = None
+        self._fused_fk_rows = {}
         self._evaluated_fks = {}
+        self._evaluated_fused_fks = None
         self._joint_to_frame = {}
         self._joint_position_symbols = KeyDefaultDict(lambda x: w.Symbol(x))  # don't iterate over this map!!
+        # str of a casadi symbol is slow, the joint state setter would call it for every joint on every update
+        self._joint_position_symbol_names = KeyDefaultDict(lambda x: str(self._joint_position_symbols[x]))
         self._joint_velocity_symbols = KeyDefaultDict(lambda x: 0)  # don't iterate over this map!!
         self._joint_velocity_linear_limit = KeyDefaultDict(lambda x: 10000) # don't overwrite urdf limits by default
         self._joint_velocity_angular_limit = KeyDefaultDict(lambda x: 100000)
@@ -42,7 +49,10 @@ class Robot(Backend):
         self._joint_acc_angular_limit = defaultdict(lambda: 100)  # no acceleration limit per default
         self._joint_weights = defaultdict(lambda: 0)
         super(Robot, self).__init__(urdf, base_pose, controlled_joints, path_to_data_folder, *args, **kwargs)
-        self.reinitialize()
+        if Backend is not PyBulletWorldObject:
+            # PyBulletWorldObject.__init__ already called self.reinitialize(), doing it again would reparse the urdf
+            # and reload it into bullet for nothing
+            self.reinitialize()
 
     @property
     def hard_constraints(self):
@@ -60,15 +70,25 @@ class Robot(Backend):
         :return:
         """
         Backend.joint_state.fset(self, value)
-        self.__joint_state_positions = {str(self._joint_position_symbols[k]): v.position for k, v in
-                                        self.joint_state.items()}
-        # self._evaluated_fks.clear()
-        self.get_fk_np.memo.clear()
+        self.__update_joint_state_positions()
+        self.__clear_evaluated_fks()
+
+    def reset_cache(self):
+        super(Robot, self).reset_cache()
+        self.__clear_evaluated_fks()
+
+    def __clear_evaluated_fks(self):
+        self._evaluated_fks.clear()
+        self._evaluated_fused_fks = None
+
+    def __update_joint_state_positions(self):
+        symbol_names = self._joint_position_symbol_names
+        self.__joint_state_positions = {symbol_names[k]: v.position for k, v in self.joint_state.items()}
 
     @memoize
     def get_controlled_parent_joint(self, link_name):
         joint = self.get_parent_joint_of_link(link_name)
-        while joint not in self.controlled_joints:
+        while not self.is_joint_controlled(joint):
             joint = self.get_parent_joint_of_joint(joint)
         return joint
 
@@ -82,7 +102,7 @@ class Robot(Backend):
             while True:
                 if joint_name is None:
                     break
-                if joint_name in self.controlled_joints:
+                if self.is_joint_controlled(joint_name):
                     if has_collision:
                         result.append(joint_name)
                     break
@@ -95,7 +115,7 @@ class Robot(Backend):
 
     @memoize
     def get_directly_controllable_collision_links(self, joint_name):
-        if joint_name not in self.controlled_joints:
+        if not self.is_joint_controlled(joint_name):
             return []
         link_name = self.get_child_link_of_joint(joint_name)
         links = [link_name]
@@ -104,7 +124,7 @@ class Robot(Backend):
             link_name = links.pop(0)
             parent_joint = self.get_parent_joint_of_link(link_name)
 
-            if parent_joint != joint_name and parent_joint in self.controlled_joints:
+            if parent_joint != joint_name and self.is_joint_controlled(parent_joint):
                 continue
             if self.has_link_collision(link_name):
                 collision_links.append(link_name)
@@ -118,7 +138,7 @@ class Robot(Backend):
         try:
             return self.__joint_state_positions
         except:
-            return {str(self._joint_position_symbols[x]): 0 for x in self.get_movable_joints()}
+            return {self._joint_position_symbol_names[x]: 0 for x in self.get_movable_joints()}
 
     def reinitialize(self):
         """
@@ -126,6 +146,9 @@ class Robot(Backend):
         :type joint_position_symbols: dict
         """
         super(Robot, self).reinitialize()
+        self.__reinitialize_expressions()
+
+    def __reinitialize_expressions(self):
         self._fk_expressions = {}
         self._create_frames_expressions()
         # self._create_constraints()
@@ -133,6 +156,7 @@ class Robot(Backend):
 
     def set_joint_position_symbols(self, symbols):
         self._joint_position_symbols = symbols
+        self._joint_position_symbol_names.clear()
 
     def set_joint_velocity_limit_symbols(self, linear, angular):
         self._joint_velocity_linear_limit = linear
@@ -156,7 +180,10 @@ class Robot(Backend):
         self.set_joint_weight_symbols(weights)
         self.set_joint_velocity_limit_symbols(linear_velocity_limit, angular_velocity_limit)
         self.set_joint_acceleration_limit_symbols(linear_acceleration_limit, angular_acceleration_limit)
-        self.reinitialize()
+        # the urdf didn't change, a full reinitialize would parse it and load it into bullet again for nothing
+        self.reset_cache()
+        self.__reinitialize_expressions()
+        self.__update_joint_state_positions()
 
     def update_self_collision_matrix(self, added_links=None, removed_links=None):
         super(Robot, self).update_self_collision_matrix(added_links, removed_links)
@@ -174,7 +201,7 @@ class Robot(Backend):
                 if urdf_joint.origin is not None:
                     xyz = urdf_joint.origin.xyz if urdf_joint.origin.xyz is not None else [0, 0, 0]
                     rpy = urdf_joint.origin.rpy if urdf_joint.origin.rpy is not None else [0, 0, 0]
-                    joint_frame = w.dot(w.translation3(*xyz), w.rotation_matrix_from_rpy(*rpy))
+                    joint_frame = w.frame_rpy(xyz[0], xyz[1], xyz[2], rpy[0], rpy[1], rpy[2])
                 else:
                     joint_frame = w.eye(4)
             else:
@@ -229,14 +256,59 @@ class Robot(Backend):
         :return: 4d matrix describing the transformation from root_link to tip_link
         :rtype: spw.Matrix
         """
-        fk = w.eye(4)
-        root_chain, _, tip_chain = self.get_split_chain(root_link, tip_link, links=False)
-        for joint_name in root_chain:
-            fk = w.dot(fk, w.inverse_frame(self.get_joint_frame(joint_name)))
-        for joint_name in tip_chain:
-            fk = w.dot(fk, self.get_joint_frame(joint_name))
-        # FIXME there is some reference fuckup going on, but i don't know where; deepcopy is just a quick fix
-        return deepcopy(fk)
+        # the cached expression is shared with other fks, hand out a copy, without deepcopy walking the whole
+        # expression graph in python
+        return w.Matrix(self.__get_fk_expression(root_link, tip_link))
+
+    def __get_fk_expression(self, root_link, tip_link):
+        """
+        Builds fks from the fk to the parent link, fks of links with a common chain share its expression, instead
+        of multiplying it again for each of them.
+        """
+        fks = self._fk_expressions
+        try:
+            return fks[root_link, tip_link]
+        except KeyError:
+            pass
+        if root_link == tip_link:
+            fks[root_link, tip_link] = w.eye(4)
+            return fks[root_link, tip_link]
+        root_chain, (connection,), tip_chain = self.get_split_chain(root_link, tip_link)
+        fk = fks.setdefault((connection, connection), w.eye(4))
+        # the frames of consecutive fixed joints are constant, they are multiplied with each other first, which
+        # casadi folds into one constant frame, instead of multiplying each of them onto the symbolic fk.
+        # anchor_fk is the fk up to the last movable joint, fixed_offset the folded frames after it
+        anchor_fk, fixed_offset = fk, None
+        # up from the connection to root_link, links and their parent joints alternate in root_chain
+        for i in range(len(root_chain) - 2, -1, -2):
+            link_name, joint_name = root_chain[i], root_chain[i + 1]
+            if self.is_joint_fixed(joint_name):
+                fixed_offset = self.get_inverse_joint_frame(joint_name) if fixed_offset is None else \
+                    w.dot(self.get_inverse_joint_frame(joint_name), fixed_offset)
+                if (link_name, connection) not in fks:
+                    fks[link_name, connection] = w.dot(fixed_offset, anchor_fk)
+                fk = fks[link_name, connection]
+            else:
+                if (link_name, connection) not in fks:
+                    fks[link_name, connection] = w.dot(self.get_inverse_joint_frame(joint_name), fk)
+                fk = fks[link_name, connection]
+                anchor_fk, fixed_offset = fk, None
+        anchor_fk, fixed_offset = fk, None
+        # down from the connection to tip_link, joints and their child links alternate in tip_chain
+        for i in range(0, len(tip_chain), 2):
+            joint_name, link_name = tip_chain[i], tip_chain[i + 1]
+            if self.is_joint_fixed(joint_name):
+                fixed_offset = self.get_joint_frame(joint_name) if fixed_offset is None else \
+                    w.dot(fixed_offset, self.get_joint_frame(joint_name))
+                if (root_link, link_name) not in fks:
+                    fks[root_link, link_name] = w.dot(anchor_fk, fixed_offset)
+                fk = fks[root_link, link_name]
+            else:
+                if (root_link, link_name) not in fks:
+                    fks[root_link, link_name] = w.dot(fk, self.get_joint_frame(joint_name))
+                fk = fks[root_link, link_name]
+                anchor_fk, fixed_offset = fk, None
+        return fk
 
     def get_fk_pose(self, root, tip):
         try:
@@ -250,9 +322,21 @@ class Robot(Backend):
             pass
         return p
 
-    @memoize
     def get_fk_np(self, root, tip):
-        return self._fks[root, tip](**self.get_joint_state_positions())
+        # cached in a plain dict instead of memoize, this is called for every collision on every tick
+        try:
+            return self._evaluated_fks[root, tip]
+        except KeyError:
+            pass
+        if (root, tip) in self._fused_fk_rows:
+            row = self._fused_fk_rows[root, tip]
+            fk_np = self.get_fused_fks_np()[row:row + 4]
+        else:
+            fk = self._fks[root, tip]
+            # skips the kwargs dict that fk(**joint_state_positions) would build over all joints
+            fk_np = fk.call_with_dict(self.get_joint_state_positions())
+        self._evaluated_fks[root, tip] = fk_np
+        return fk_np
 
     def init_fast_fks(self):
         def f(key):
@@ -261,7 +345,66 @@ class Robot(Backend):
             m = w.speed_up(fk, w.free_symbols(fk))
             return m
 
+        def stacked_f(root_tip_pairs):
+            fks = w.vstack([self.get_fk_expression(root, tip) for root, tip in root_tip_pairs])
+            return w.speed_up(fks, w.free_symbols(fks), cse=True)
+
         self._fks = KeyDefaultDict(f)
+        self._stacked_fks = KeyDefaultDict(stacked_f)
+        self._fused_fks = None
+        self._fused_fk_rows = {}
+
+    def compile_fks(self, root_tip_pairs):
+        """
+        Compiles the fks of root_tip_pairs into one function, which evaluates all of them with a single call.
+        Afterwards get_fk_np of any of these pairs evaluates all of them once per joint state.
+        :type root_tip_pairs: list
+        """
+        # sorted, the same pairs collected in a different order reuse the function compiled for them in _stacked_fks
+        root_tip_pairs = tuple(sorted(set(root_tip_pairs)))
+        if self._fused_fks is not None and set(root_tip_pairs) == set(self._fused_fk_rows):
+            return
+        self._fused_fks = self._stacked_fks[root_tip_pairs]
+        self._fused_fk_rows = {pair: i * 4 for i, pair in enumerate(root_tip_pairs)}
+        self.__clear_evaluated_fks()
+
+    def get_fused_fks_np(self):
+        """
+        :return: the fks of all pairs passed to compile_fks stacked on top of each other
+        :rtype: np.ndarray
+        """
+        if self._evaluated_fused_fks is None:
+            self._evaluated_fused_fks = self._fused_fks.call_with_dict(self.get_joint_state_positions())
+        return self._evaluated_fused_fks
+
+    def get_fks_np(self, root_tip_pairs):
+        """
+        Evaluates the fks of all root_tip_pairs with a single call of a function compiled for this tuple of pairs.
+        :type root_tip_pairs: tuple
+        :return: array with shape (len(root_tip_pairs), 4, 4), in the same order as root_tip_pairs
+        :rtype: np.ndarray
+        """
+        if not root_tip_pairs:
+            return np.zeros((0, 4, 4))
+        fks = self._stacked_fks[root_tip_pairs]
+        joint_state_positions = self.get_joint_state_positions()
+        # a single view of the stacked result instead of a list with a view per fk
+        return fks.call_with_dict(joint_state_positions).reshape(-1, 4, 4)
+
+    def get_fk_np_batch(self, root, tip, joint_states):
+        """
+        Evaluates the fk from root to tip for many joint states at once, e.g. to check sampled configurations.
+        :type root: str
+        :type tip: str
+        :param joint_states: list of dicts mapping joint names to SingleJointState
+        :type joint_states: list
+        :return: array with shape (len(joint_states), 4, 4)
+        :rtype: np.ndarray
+        """
+        fk = self._fks[root, tip]
+        symbol_names = {self._joint_position_symbol_names[joint_name]: joint_name for joint_name in self.joint_state}
+        args = [[joint_state[symbol_names[param]].position for param in fk.str_params] for joint_state in joint_states]
+        return fk.call_batch(args)
 
     # JOINT FUNCTIONS
 
@@ -291,6 +434,18 @@ class Robot(Backend):
         else:
             return w.Min(limit.velocity, limit_symbol)
 
+    @memoize
+    def get_joint_velocity_limits_compiled(self, joint_names):
+        """
+        Compiling is expensive, the limits only change when new symbols are set, which resets the cache.
+        :param joint_names: names of the joints in the urdfs
+        :type joint_names: tuple
+        :return: function that evaluates the velocity limits of joint_names stacked on top of each other
+        :rtype: w.CompiledFunction
+        """
+        limits = w.vstack([self.get_joint_velocity_limit_expr(joint_name) for joint_name in joint_names])
+        return w.speed_up(limits, w.free_symbols(limits))
+
     def get_joint_velocity_limit_expr_evaluated(self, joint_name, god_map):
         """
         :param joint_name: name of the joint in the urdfs
@@ -298,10 +453,18 @@ class Robot(Backend):
         :return: minimum of default velocity limit and limit specified in urdfs
         :rtype: float
         """
-        limit = self.get_joint_velocity_limit_expr(joint_name)
-        f = w.speed_up(limit, w.free_symbols(limit))
+        f = self.get_joint_velocity_limits_compiled((joint_name,))
         return f.call2(god_map.get_values(f.str_params))[0][0]
 
+    def get_joint_velocity_limits_expr_evaluated(self, god_map):
+        """
+        :return: velocity limits of all controlled joints in the same order, evaluated with a single call
+        :rtype: np.ndarray
+        """
+        f = self.get_joint_velocity_limits_compiled(tuple(self.controlled_joints))
+        # flatten copies the result out of the shared output buffer
+        return f.call2(god_map.get_values(f.str_params)).flatten()
+
     def get_joint_frame(self, joint_name):
         """
         :param joint_name: name of the joint in the urdfs
@@ -311,6 +474,17 @@ class Robot(Backend):
         """
         return self._joint_to_frame[joint_name]
 
+    @memoize
+    def get_inverse_joint_frame(self, joint_name):
+        """
+        Every fk that goes up a chain needs this, build it only once per joint.
+        :param joint_name: name of the joint in the urdfs
+        :type joint_name: str
+        :return: inverse of get_joint_frame
+        :rtype: spw.Matrix
+        """
+        return w.inverse_frame(self.get_joint_frame(joint_name))
+
     def get_joint_position_symbol(self, joint_name):
         """
         :param joint_name: name of the joint in the urdfs
@@ -319,7 +493,12 @@ class Robot(Backend):
         """
         return self._joint_position_symbols[joint_name]
 
+    @memoize
     def get_joint_position_symbols(self):
+        """
+        memoized, because every constraint asks for these when it computes its jacobian
+        :rtype: list
+        """
         return [self.get_joint_position_symbol(joint_name) for joint_name in self.controlled_joints]
 
     def get_joint_velocity_symbol(self, joint_name):
@@ -330,7 +509,12 @@ class Robot(Backend):
         """
         return self._joint_velocity_symbols[joint_name]
 
+    @memoize
     def get_joint_velocity_symbols(self):
+        """
+        memoized for the same reason as get_joint_position_symbols
+        :rtype: list
+        """
         return [self.get_joint_velocity_symbol(joint_name) for joint_name in self.controlled_joints]
 
     def generate_joint_state(self, f):
@@ -355,27 +539,36 @@ class Robot(Backend):
         :type link_b: str
         :rtype: bool
         """
-        try:
-            self.get_controlled_parent_joint(link_a)
-        except KeyError:
+        if not self.has_controlled_parent_joint(link_a):
             return False
-        try:
-            self.get_controlled_parent_joint(link_b)
-        except KeyError:
+        if not self.has_controlled_parent_joint(link_b):
             return True
         return link_a < link_b
 
+    @memoize
+    def has_controlled_parent_joint(self, link_name):
+        """
+        memoize doesn't remember the KeyError of get_controlled_parent_joint, this does.
+        :type link_name: str
+        :rtype: bool
+        """
+        try:
+            self.get_controlled_parent_joint(link_name)
+            return True
+        except KeyError:
+            return False
+
     @memoize
     def get_chain_reduced_to_controlled_joints(self, link_a, link_b):
         chain = self.get_chain(link_b, link_a)
         for i, thing in enumerate(chain):
-            if i % 2 == 1 and thing in self.controlled_joints:
+            if i % 2 == 1 and self.is_joint_controlled(thing):
                 new_link_b = chain[i - 1]
                 break
         else:
             raise KeyError(u'no controlled joint in chain between {} and {}'.format(link_a, link_b))
         for i, thing in enumerate(reversed(chain)):
-            if i % 2 == 1 and thing in self.controlled_joints:
+            if i % 2 == 1 and self.is_joint_controlled(thing):
                 new_link_a = chain[len(chain) - i]
                 break
         else:
@@ -95,8 +95,8 @@ class InstantaneousController(object):
         next_cmd, H, A, lb, ub, lbA, ubA, xdot_full = self.qp_problem_builder.get_cmd(substitutions, nWSR)
         if next_cmd is None:
             pass
-        return {name: next_cmd[symbol] for name, symbol in self.joint_to_symbols_str.items()}, \
-               H, A, lb, ub, lbA, ubA, xdot_full
+        # joint_to_symbols_str is ordered like the controlled joints of the qp
+        return dict(zip(self.joint_to_symbols_str, next_cmd)), H, A, lb, ub, lbA, ubA, xdot_full
 
     def get_expr(self):
         return self.qp_problem_builder.get_expr()
@@ -321,12 +321,12 @@ def kdl_to_quaternion(rotation_matrix):
 
 
 def np_to_kdl(matrix):
-    r = PyKDL.Rotation(matrix[0, 0], matrix[0, 1], matrix[0, 2],
-                       matrix[1, 0], matrix[1, 1], matrix[1, 2],
-                       matrix[2, 0], matrix[2, 1], matrix[2, 2])
-    p = PyKDL.Vector(matrix[0, 3],
-                     matrix[1, 3],
-                     matrix[2, 3])
+    # one conversion to python floats, indexing numpy arrays element by element is slow
+    (r00, r01, r02, x), (r10, r11, r12, y), (r20, r21, r22, z) = np.asarray(matrix)[:3].tolist()
+    r = PyKDL.Rotation(r00, r01, r02,
+                       r10, r11, r12,
+                       r20, r21, r22)
+    p = PyKDL.Vector(x, y, z)
     return PyKDL.Frame(r, p)
 
 
@@ -350,9 +350,12 @@ def kdl_to_np(kdl_thing):
                          kdl_thing[1],
                          kdl_thing[2]])
     if isinstance(kdl_thing, PyKDL.Frame):
-        return np.array([[kdl_thing.M[0, 0], kdl_thing.M[0, 1], kdl_thing.M[0, 2], kdl_thing.p[0]],
-                         [kdl_thing.M[1, 0], kdl_thing.M[1, 1], kdl_thing.M[1, 2], kdl_thing.p[1]],
-                         [kdl_thing.M[2, 0], kdl_thing.M[2, 1], kdl_thing.M[2, 2], kdl_thing.p[2]],
+        # every access of .M or .p creates a new wrapper object, they are looked up only once
+        M = kdl_thing.M
+        p = kdl_thing.p
+        return np.array([[M[0, 0], M[0, 1], M[0, 2], p[0]],
+                         [M[1, 0], M[1, 1], M[1, 2], p[1]],
+                         [M[2, 0], M[2, 1], M[2, 2], p[2]],
                          [0, 0, 0, 1]])
     if isinstance(kdl_thing, PyKDL.Rotation):
         return np.array([[kdl_thing[0, 0], kdl_thing[0, 1], kdl_thing[0, 2], 0],
@@ -1,12 +1,14 @@
 import numpy as np
-from copy import deepcopy
+from copy import copy, deepcopy
 from collections import namedtuple
 from itertools import chain
 import hashlib
 import urdf_parser_py.urdf as up
+from xml.sax.saxutils import quoteattr
 from geometry_msgs.msg import Pose, Vector3, Quaternion, Point
 from std_msgs.msg import ColorRGBA
-from tf.transformations import euler_from_quaternion, quaternion_from_euler, rotation_from_matrix, quaternion_matrix
+from tf.transformations import euler_from_quaternion, quaternion_from_euler, rotation_from_matrix, quaternion_matrix, \
+    euler_matrix
 from visualization_msgs.msg import Marker
 
 from giskardpy.exceptions import DuplicateNameException, UnknownBodyException, CorruptShapeException
@@ -18,6 +20,25 @@ from giskardpy.tfwrapper import normalize
 def robot_name_from_urdf_string(urdf_string):
     return urdf_string.split('robot name="')[1].split('"')[0]
 
+def single_link_urdf(name, geometry):
+    """
+    Builds the urdf string of an object with a single link directly, constructing a up.Robot and serializing it is
+    much slower.
+    :param name: name of the robot and its link
+    :type name: str
+    :param geometry: urdf geometry tag, e.g. <box size="1 1 1"/>
+    :type geometry: str
+    :rtype: str
+    """
+    name = quoteattr(name)
+    return u'<robot name={0}>' \
+           u'<link name={0}>' \
+           u'<visual><geometry>{1}</geometry><material name="green"><color rgba="0 1 0 1"/></material></visual>' \
+           u'<collision><geometry>{1}</geometry></collision>' \
+           u'</link>' \
+           u'</robot>'.format(name, geometry)
+
+
 def hacky_urdf_parser_fix(urdf_str):
     # TODO this function is inefficient but the tested urdfs's aren't big enough for it to be a problem
     fixed_urdf = ''
@@ -65,12 +86,20 @@ class URDFObject(object):
         self.reset_cache()
 
     def reset_cache(self):
-        for method_name in dir(self):
-            try:
-                getattr(self, method_name).memo.clear()
-            except:
-                pass
+        for method in self.get_memoized_methods():
+            method.memo_reset(self)
 
+    @classmethod
+    def get_memoized_methods(cls):
+        """
+        Collected once per class, iterating over dir(self) would also evaluate every property.
+        :return: all functions of this class and its bases that are decorated with @memoize
+        :rtype: list
+        """
+        if u'_memoized_methods' not in cls.__dict__:
+            cls._memoized_methods = [method for klass in cls.__mro__ for method in klass.__dict__.values()
+                                     if hasattr(method, u'memo_reset')]
+        return cls._memoized_methods
 
     @classmethod
     def from_urdf_file(cls, urdf_file, *args, **kwargs):
@@ -94,40 +123,28 @@ class URDFObject(object):
         :type world_body: giskard_msgs.msg._WorldBody.WorldBody
         :rtype: URDFObject
         """
-        links = []
-        joints = []
         if world_body.type == world_body.PRIMITIVE_BODY or world_body.type == world_body.MESH_BODY:
             if world_body.shape.type == world_body.shape.BOX:
-                geometry = up.Box(world_body.shape.dimensions)
+                geometry = u'<box size="{} {} {}"/>'.format(*world_body.shape.dimensions)
             elif world_body.shape.type == world_body.shape.SPHERE:
-                geometry = up.Sphere(world_body.shape.dimensions[0])
+                geometry = u'<sphere radius="{}"/>'.format(world_body.shape.dimensions[0])
             elif world_body.shape.type == world_body.shape.CYLINDER:
-                geometry = up.Cylinder(world_body.shape.dimensions[world_body.shape.CYLINDER_RADIUS],
-                                       world_body.shape.dimensions[world_body.shape.CYLINDER_HEIGHT])
+                geometry = u'<cylinder radius="{}" length="{}"/>'.format(
+                    world_body.shape.dimensions[world_body.shape.CYLINDER_RADIUS],
+                    world_body.shape.dimensions[world_body.shape.CYLINDER_HEIGHT])
             elif world_body.shape.type == world_body.shape.CONE:
                 raise TypeError(u'primitive shape cone not supported')
             elif world_body.type == world_body.MESH_BODY:
-                geometry = up.Mesh(world_body.mesh)
+                geometry = u'<mesh filename={}/>'.format(quoteattr(world_body.mesh))
             else:
                 raise CorruptShapeException(u'primitive shape \'{}\' not supported'.format(world_body.shape.type))
-            # FIXME test if this works on 16.04
-            try:
-                link = up.Link(world_body.name)
-                link.add_aggregate(u'visual', up.Visual(geometry,
-                                                        material=up.Material(u'green', color=up.Color(0, 1, 0, 1))))
-                link.add_aggregate(u'collision', up.Collision(geometry))
-            except AssertionError:
-                link = up.Link(world_body.name,
-                               visual=up.Visual(geometry, material=up.Material(u'green', color=up.Color(0, 1, 0, 1))),
-                               collision=up.Collision(geometry))
-            links.append(link)
+            return cls(single_link_urdf(world_body.name, geometry), *args, **kwargs)
         elif world_body.type == world_body.URDF_BODY:
             o = cls(world_body.urdf, *args, **kwargs)
             o.set_name(world_body.name)
             return o
         else:
             raise CorruptShapeException(u'world body type \'{}\' not supported'.format(world_body.type))
-        return cls.from_parts(world_body.name, links, joints, *args, **kwargs)
 
     @classmethod
     def from_object_state(cls, object_state, *args, **kwargs):
@@ -205,23 +222,50 @@ class URDFObject(object):
     def get_split_chain(self, root, tip, joints=True, links=True, fixed=True):
         if root == tip:
             return [], [], []
-        root_chain = self._urdf_robot.get_chain(self.get_root(), root, False, True, True)
-        tip_chain = self._urdf_robot.get_chain(self.get_root(), tip, False, True, True)
+        root_chain = self.get_link_names_from_root(root)
+        tip_chain = self.get_link_names_from_root(tip)
         for i in range(min(len(root_chain), len(tip_chain))):
             if root_chain[i] != tip_chain[i]:
                 break
         else:
             i += 1
         connection = tip_chain[i - 1]
-        root_chain = self._urdf_robot.get_chain(connection, root, joints, links, fixed)
-        if links:
-            root_chain = root_chain[1:]
+        # the links below the connection are already known, instead of walking up from root and tip again,
+        # only their parent joints have to be looked up
+        root_chain = self.__get_chain_below_connection(root_chain[i:], joints, links, fixed)
         root_chain.reverse()
-        tip_chain = self._urdf_robot.get_chain(connection, tip, joints, links, fixed)
-        if links:
-            tip_chain = tip_chain[1:]
+        tip_chain = self.__get_chain_below_connection(tip_chain[i:], joints, links, fixed)
         return root_chain, [connection] if links else [], tip_chain
 
+    def __get_chain_below_connection(self, link_names, joints, links, fixed):
+        """
+        :param link_names: links of a chain from the first link after the connecting link to the end of the chain
+        :type link_names: list
+        :return: link_names with their parent joints in between, filtered like in get_chain
+        :rtype: list
+        """
+        parent_map = self._urdf_robot.parent_map
+        joint_map = self._urdf_robot.joint_map
+        chain = []
+        for link_name in link_names:
+            if joints:
+                joint_name = parent_map[link_name][0]
+                if fixed or joint_map[joint_name].type != FIXED_JOINT:
+                    chain.append(joint_name)
+            if links:
+                chain.append(link_name)
+        return chain
+
+    @memoize
+    def get_link_names_from_root(self, link_name):
+        """
+        Used by get_split_chain to find the connecting link, memoized per link instead of per (root, tip) pair.
+        :type link_name: str
+        :return: all links from the root of this urdf to link_name, don't modify it
+        :rtype: list
+        """
+        return self._urdf_robot.get_chain(self.get_root(), link_name, False, True, True)
+
     @memoize
     def get_chain(self, root, tip, joints=True, links=True, fixed=True):
         """
@@ -447,7 +491,31 @@ class URDFObject(object):
 
     @memoize
     def get_links_from_sub_tree(self, joint_name):
-        return self.get_sub_tree_at_joint(joint_name).get_link_names()
+        """
+        :type joint_name: str
+        :return: child link of joint_name and all links below it
+        :rtype: list
+        """
+        return self.get_joints_and_links_from_sub_tree(joint_name)[1]
+
+    @memoize
+    def get_joints_and_links_from_sub_tree(self, joint_name):
+        """
+        Walks the sub tree once for its joints and links.
+        :type joint_name: str
+        :return: joint_name and all joints below it, child link of joint_name and all links below it
+        :rtype: tuple
+        """
+        # walks the child map directly, get_sub_tree_at_joint would build and parse a whole new urdf
+        child_map = self._urdf_robot.child_map
+        joints = [joint_name]
+        links = [self.get_child_link_of_joint(joint_name)]
+        for link_name in links:
+            if link_name in child_map:
+                for child_joint, child_link in child_map[link_name]:
+                    joints.append(child_joint)
+                    links.append(child_link)
+        return joints, links
 
     @memoize
     def get_links_with_collision(self):
@@ -459,17 +527,9 @@ class URDFObject(object):
         :type joint_name: str
         :rtype: URDFObject
         """
-        tree_links = []
-        tree_joints = []
-        joints = [joint_name]
-        for joint in joints:
-            child_link = self._urdf_robot.joint_map[joint].child
-            if child_link in self._urdf_robot.child_map:
-                for j, l in self._urdf_robot.child_map[child_link]:
-                    joints.append(j)
-                    tree_joints.append(self.get_urdf_joint(j))
-            tree_links.append(self.get_urdf_link(child_link))
-
+        joints, links = self.get_joints_and_links_from_sub_tree(joint_name)
+        tree_links = [self.get_urdf_link(link_name) for link_name in links]
+        tree_joints = [self.get_urdf_joint(joint) for joint in joints[1:]]
         return URDFObject.from_parts(joint_name, tree_links, tree_joints)
 
     @memoize
@@ -497,16 +557,52 @@ class URDFObject(object):
         :return: True if collision geometry is mesh or simple shape with volume/surface bigger than thresholds.
         :rtype: bool
         """
-        link = self._urdf_robot.link_map[link_name]
-        if link.collision is not None:
+        return link_name in self.get_link_name_set_with_collision(volume_threshold, surface_threshold)
+
+    @memoize
+    def get_link_name_set_with_collision(self, volume_threshold=1.001e-6, surface_threshold=0.00061):
+        """
+        Checks the collision geometries of all links at once, by computing the volumes and surfaces of all shapes of
+        the same type in one go.
+        :param volume_threshold: m**3, ignores simple geometry shapes with a volume less than this
+        :type volume_threshold: float
+        :param surface_threshold: m**2, ignores simple geometry shapes with a surface area less than this
+        :type surface_threshold: float
+        :return: links whose collision geometry is a mesh or simple shape with volume/surface bigger than thresholds.
+        :rtype: set
+        """
+        result = set()
+        boxes, box_sizes = [], []
+        spheres, sphere_radii = [], []
+        cylinders, cylinder_sizes = [], []
+        for link_name, link in self._urdf_robot.link_map.items():
+            if link.collision is None:
+                continue
             geo = link.collision.geometry
-            return isinstance(geo, up.Box) and (cube_volume(*geo.size) > volume_threshold or
-                                                cube_surface(*geo.size) > surface_threshold) or \
-                   isinstance(geo, up.Sphere) and sphere_volume(geo.radius) > volume_threshold or \
-                   isinstance(geo, up.Cylinder) and (cylinder_volume(geo.radius, geo.length) > volume_threshold or
-                                                     cylinder_surface(geo.radius, geo.length) > surface_threshold) or \
-                   isinstance(geo, up.Mesh)
-        return False
+            if isinstance(geo, up.Box):
+                boxes.append(link_name)
+                box_sizes.append(geo.size)
+            elif isinstance(geo, up.Sphere):
+                spheres.append(link_name)
+                sphere_radii.append(geo.radius)
+            elif isinstance(geo, up.Cylinder):
+                cylinders.append(link_name)
+                cylinder_sizes.append((geo.radius, geo.length))
+            elif isinstance(geo, up.Mesh):
+                result.add(link_name)
+        if boxes:
+            box_sizes = np.array(box_sizes, dtype=float).T
+            big = (cube_volume(*box_sizes) > volume_threshold) | (cube_surface(*box_sizes) > surface_threshold)
+            result.update(link_name for link_name, is_big in zip(boxes, big) if is_big)
+        if spheres:
+            big = sphere_volume(np.array(sphere_radii, dtype=float)) > volume_threshold
+            result.update(link_name for link_name, is_big in zip(spheres, big) if is_big)
+        if cylinders:
+            cylinder_sizes = np.array(cylinder_sizes, dtype=float).T
+            big = (cylinder_volume(*cylinder_sizes) > volume_threshold) | \
+                  (cylinder_surface(*cylinder_sizes) > surface_threshold)
+            result.update(link_name for link_name, is_big in zip(cylinders, big) if is_big)
+        return result
 
     @memoize
     @profile
@@ -541,22 +637,27 @@ class URDFObject(object):
         return result
 
     def __get_non_base_movement_root_helper(self, link_name):
+        # follow the first child down to the first link with collision, then walk back up
+        path = [link_name]
+        while not self.has_link_collision(link_name):
+            children = self.get_child_links_of_link(link_name)
+            if not children:
+                break
+            link_name = children[0]
+            path.append(link_name)
+        result = None
         if self.has_link_collision(link_name):
             parent_joint = self.get_parent_joint_of_link(link_name)
             if self.is_joint_movable(parent_joint):
-                return link_name
-            else:
-                return None
-        else:
-            for child in self.get_child_links_of_link(link_name):
-                child_result = self.__get_non_base_movement_root_helper(child)
-                if child_result is None:
-                    parent_joint = self.get_parent_joint_of_link(link_name)
-                    if parent_joint is not None and self.is_joint_movable(parent_joint):
-                        return link_name
-                    else:
-                        return None
-                return child_result
+                result = link_name
+        # links with a fixed parent joint are skipped, the first link above them with a movable one is the result
+        for link_name in reversed(path[:-1]):
+            if result is not None:
+                break
+            parent_joint = self.get_parent_joint_of_link(link_name)
+            if parent_joint is not None and self.is_joint_movable(parent_joint):
+                result = link_name
+        return result
 
     def attach_urdf_object(self, urdf_object, parent_link, pose, round_to=3):
         """
@@ -643,8 +744,8 @@ class URDFObject(object):
     def __str__(self):
         return self.get_urdf_str()
 
-    def __hash__(self):
-        return hash(id(self))
+    # same identity hash as hash(id(self)), but without a python call, self is part of every memoize key
+    __hash__ = object.__hash__
 
     @profile
     def reinitialize(self):
@@ -783,7 +884,24 @@ class URDFObject(object):
         else:
             return None
 
+    @memoize
+    def get_visual_offset_np(self, link_name):
+        """
+        :return: 4x4 matrix of the origin/offset of the visual in the link object with the given link name
+        :rtype: np.ndarray
+        """
+        visual_offset = self.get_urdf_link(link_name).visual.origin
+        m = euler_matrix(*visual_offset.rpy)
+        m[:3, 3] = visual_offset.xyz
+        return m
+
     def link_as_marker(self, link_name):
+        """
+        Only the header and the top level fields of the returned marker may be changed, e.g. marker.pose = new_pose,
+        the remaining nested messages are shared with the cached marker.
+        :type link_name: str
+        :rtype: Marker
+        """
         if link_name not in self._link_to_marker:
             marker = Marker()
             geometry = self.get_urdf_link(link_name).visual.geometry
@@ -834,4 +952,7 @@ class URDFObject(object):
                 marker.pose = self.get_visual_pose(link_name)
             self._link_to_marker[link_name] = marker
 
-        return deepcopy(self._link_to_marker[link_name])
+        # deepcopy of a ros msg is slow and this is called for every link on every visualization tick
+        marker = copy(self._link_to_marker[link_name])
+        marker.header = copy(marker.header)
+        return marker
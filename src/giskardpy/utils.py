@@ -6,7 +6,6 @@ import os
 from copy import deepcopy
 
 import pydot
-import pylab as plt
 import re
 import rospkg
 import subprocess
@@ -16,6 +15,7 @@ from collections import defaultdict, OrderedDict, deque
 from contextlib import contextmanager
 from functools import wraps
 from itertools import product
+from weakref import ref
 
 import numpy as np
 import pkg_resources
@@ -382,6 +382,8 @@ def plot_trajectory(tj, controlled_joints, path_to_data_folder, sample_period, o
     :param tick_stride: the distance between ticks in the plot. if tick_stride <= 0 pyplot determines the ticks automatically
     """
 
+    import pylab as plt
+
     def ceil(val, base=0.0, stride=1.0):
         base = base % stride
         return np.ceil((float)(val - base) / stride) * stride + base
@@ -824,22 +826,42 @@ def str_to_unique_number(s):
 
 
 def memoize(function):
+    """
+    Meant for methods, the results are cached per object.
+    function.memo_reset(obj) drops the whole memo of obj, without touching the memos of other objects.
+    The memo of an object is also dropped, when the object is garbage collected.
+    """
     memo = function.memo = {}
+    refs = {}
+    no_kwargs = frozenset()
+
+    def forget(obj_id):
+        memo.pop(obj_id, None)
+        refs.pop(obj_id, None)
 
     @wraps(function)
-    def wrapper(*args, **kwargs):
+    def wrapper(self, *args, **kwargs):
         # key = cPickle.dumps((args, kwargs))
         # key = pickle.dumps((args, sorted(kwargs.items()), -1))
-        key = (args, frozenset(kwargs.items()))
+        # almost all calls are without kwargs, don't build a new frozenset for them
+        key = (args, frozenset(kwargs.items()) if kwargs else no_kwargs)
         try:
-            return memo[key]
+            return memo[id(self)][key]
         except KeyError:
-            rv = function(*args, **kwargs)
-            memo[key] = rv
+            rv = function(self, *args, **kwargs)
+            obj_id = id(self)
+            if obj_id not in memo:
+                memo[obj_id] = {}
+                if obj_id not in refs:
+                    # self is not part of the key, so the memo doesn't keep it alive
+                    refs[obj_id] = ref(self, lambda _: forget(obj_id))
+            memo[obj_id][key] = rv
             return rv
 
+    wrapper.memo_reset = lambda obj: memo.pop(id(obj), None)
     return wrapper
 
+
 def traj_to_msg(sample_period, trajectory, controlled_joints, fill_velocity_values):
     """
     :type traj: giskardpy.data_types.Trajectory
@@ -848,17 +870,19 @@ def traj_to_msg(sample_period, trajectory, controlled_joints, fill_velocity_valu
     trajectory_msg = JointTrajectory()
     trajectory_msg.header.stamp = rospy.get_rostime() + rospy.Duration(0.5)
     trajectory_msg.joint_names = controlled_joints
+    points = []
     for time, traj_point in trajectory.items():
+        try:
+            joint_states = [traj_point[joint_name] for joint_name in controlled_joints]
+        except KeyError:
+            raise NotImplementedError(u'generated traj does not contain all joints')
         p = JointTrajectoryPoint()
         p.time_from_start = rospy.Duration(time*sample_period)
-        for joint_name in controlled_joints:
-            if joint_name in traj_point:
-                p.positions.append(traj_point[joint_name].position)
-                if fill_velocity_values:
-                    p.velocities.append(traj_point[joint_name].velocity)
-            else:
-                raise NotImplementedError(u'generated traj does not contain all joints')
-        trajectory_msg.points.append(p)
+        p.positions = [sjs.position for sjs in joint_states]
+        if fill_velocity_values:
+            p.velocities = [sjs.velocity for sjs in joint_states]
+        points.append(p)
+    trajectory_msg.points = points
     return trajectory_msg
 
 def make_filter_b_mask(H):
@@ -870,7 +894,7 @@ def make_filter_masks(H, num_joint_constraints, num_hard_constraints):
     if num_hard_constraints == 0:
         bA_mask = s_mask
     else:
-        bA_mask = np.concatenate((np.array([True] * num_hard_constraints), s_mask))
+        bA_mask = np.concatenate((np.ones(num_hard_constraints, dtype=bool), s_mask))
 
     return bA_mask, b_mask
 
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from geometry_msgs.msg import PoseStamped
 from giskard_msgs.msg import CollisionEntry
 
@@ -184,14 +186,10 @@ class World(object):
     def get_robot_collision_matrix(self, min_dist):
         robot_name = self.robot.get_name()
         collision_matrix = self.robot.get_self_collision_matrix()
-        collision_matrix2 = {}
-        for link1, link2 in collision_matrix:
-            # FIXME should I use the minimum of both distances?
-            if self.robot.link_order(link1, link2):
-                collision_matrix2[link1, robot_name, link2] = min_dist[link1]
-            else:
-                collision_matrix2[link2, robot_name, link1] = min_dist[link1]
-        return collision_matrix2
+        link_order = self.robot.link_order
+        # FIXME should I use the minimum of both distances?
+        return {(link1, robot_name, link2) if link_order(link1, link2) else (link2, robot_name, link1): min_dist[link1]
+                for link1, link2 in collision_matrix}
 
     def collision_goals_to_collision_matrix(self, collision_goals, min_dist):
         """
@@ -202,23 +200,29 @@ class World(object):
         """
         collision_goals = self.verify_collision_entries(collision_goals)
         min_allowed_distance = {}
+        # (robot_link, body_b) -> keys added for it, such that allowing all link_bs doesn't have to scan every key.
+        # may contain keys that have been removed in the meantime
+        keys_by_link_and_body = defaultdict(set)
         for collision_entry in collision_goals:  # type: CollisionEntry
             if self.is_avoid_all_self_collision(collision_entry):
-                min_allowed_distance.update(self.get_robot_collision_matrix(min_dist))
+                self_collision_matrix = self.get_robot_collision_matrix(min_dist)
+                min_allowed_distance.update(self_collision_matrix)
+                for key in self_collision_matrix:
+                    keys_by_link_and_body[key[:2]].add(key)
                 continue
             assert len(collision_entry.robot_links) == 1
             assert len(collision_entry.link_bs) == 1
             key = (collision_entry.robot_links[0], collision_entry.body_b, collision_entry.link_bs[0])
             if self.is_allow_collision(collision_entry):
                 if self.all_link_bs(collision_entry):
-                    for key2 in list(min_allowed_distance.keys()):
-                        if key[0] == key2[0] and key[1] == key2[1]:
-                            del min_allowed_distance[key2]
+                    for key2 in keys_by_link_and_body.pop(key[:2], ()):
+                        min_allowed_distance.pop(key2, None)
                 elif key in min_allowed_distance:
                     del min_allowed_distance[key]
 
             elif self.is_avoid_collision(collision_entry):
                 min_allowed_distance[key] = min_dist[key[0]]
+                keys_by_link_and_body[key[:2]].add(key)
             else:
                 raise Exception('todo')
         return min_allowed_distance
@@ -264,7 +268,8 @@ class World(object):
             ce.body_b = CollisionEntry.ALL
             ce.link_bs = [CollisionEntry.ALL]
             ce.min_dist = -1
-            collision_goals.insert(0, ce)
+            # new list instead of insert, which would also change the list of the caller
+            collision_goals = [ce] + collision_goals
 
         # split body bs
         collision_goals = self.split_body_b(collision_goals)
@@ -282,7 +287,7 @@ class World(object):
         robot_links = set(self.robot.get_link_names())
         for collision_entry in collision_goals:
             if not (collision_entry.body_b == robot_name or
-                    collision_entry.body_b in self.get_object_names() or
+                    collision_entry.body_b in self._objects or
                     self.all_body_bs(collision_entry)):
                 raise UnknownBodyException(u'body b \'{}\' unknown'.format(collision_entry.body_b))
             if not self.all_robot_links(collision_entry):
@@ -295,7 +300,7 @@ class World(object):
                         raise UnknownBodyException(
                             u'link b \'{}\' of body \'{}\' unknown'.format(robot_link, collision_entry.body_b))
             elif not self.all_body_bs(collision_entry) and not self.all_link_bs(collision_entry):
-                object_links = self.get_object(collision_entry.body_b).get_link_names()
+                object_links = set(self.get_object(collision_entry.body_b).get_link_names())
                 for link_b in collision_entry.link_bs:
                     if link_b not in object_links:
                         raise UnknownBodyException(
@@ -303,120 +308,96 @@ class World(object):
 
     def split_link_bs(self, collision_goals):
         # FIXME remove the side effects of these three methods
-        i = 0
-        while i < len(collision_goals):
-            collision_entry = collision_goals[i]
-            if self.is_avoid_all_self_collision(collision_entry):
-                i += 1
+        robot_name = self.robot.get_name()
+        # index of the last entry with specific link_bs for each combination of robot_links and body_b
+        last_specific_link_bs = {}
+        for i, collision_entry in enumerate(collision_goals):
+            if not self.all_link_bs(collision_entry):
+                last_specific_link_bs[tuple(collision_entry.robot_links), collision_entry.body_b] = i
+        # the new entries are collected in a new list, removing and inserting in place is quadratic
+        new_collision_goals = []
+        for i, collision_entry in enumerate(collision_goals):
+            # same as is_avoid_all_self_collision, but all_link_bs is only evaluated once
+            all_link_bs = self.all_link_bs(collision_entry)
+            if all_link_bs and collision_entry.body_b == robot_name and self.is_avoid_collision(collision_entry) \
+                    and self.all_robot_links(collision_entry):
+                new_collision_goals.append(collision_entry)
                 continue
-            if self.all_link_bs(collision_entry):
-                if collision_entry.body_b == self.robot.get_name():
-                    new_ces = []
+            if all_link_bs:
+                if collision_entry.body_b == robot_name:
                     link_bs = self.robot.get_possible_collisions(list(collision_entry.robot_links)[0])
-                elif [x for x in collision_goals[i:] if
-                      x.robot_links == collision_entry.robot_links and
-                      x.body_b == collision_entry.body_b and not self.all_link_bs(x)]:
-                    new_ces = []
+                elif last_specific_link_bs.get((tuple(collision_entry.robot_links), collision_entry.body_b), -1) > i:
                     link_bs = self.get_object(collision_entry.body_b).get_link_names_with_collision()
                 else:
-                    i += 1
+                    new_collision_goals.append(collision_entry)
                     continue
-                collision_goals.remove(collision_entry)
-                for link_b in link_bs:
-                    ce = CollisionEntry()
-                    ce.type = collision_entry.type
-                    ce.robot_links = collision_entry.robot_links
-                    ce.body_b = collision_entry.body_b
-                    ce.min_dist = collision_entry.min_dist
-                    ce.link_bs = [link_b]
-                    new_ces.append(ce)
-                for new_ce in new_ces:
-                    collision_goals.insert(i, new_ce)
-                i += len(new_ces)
-                continue
             elif len(collision_entry.link_bs) > 1:
-                collision_goals.remove(collision_entry)
-                for link_b in collision_entry.link_bs:
-                    ce = CollisionEntry()
-                    ce.type = collision_entry.type
-                    ce.robot_links = collision_entry.robot_links
-                    ce.body_b = collision_entry.body_b
-                    ce.link_bs = [link_b]
-                    ce.min_dist = collision_entry.min_dist
-                    collision_goals.insert(i, ce)
-                i += len(collision_entry.link_bs)
+                link_bs = collision_entry.link_bs
+            else:
+                new_collision_goals.append(collision_entry)
                 continue
-            i += 1
-        return collision_goals
+            for link_b in link_bs:
+                ce = CollisionEntry()
+                ce.type = collision_entry.type
+                ce.robot_links = collision_entry.robot_links
+                ce.body_b = collision_entry.body_b
+                ce.min_dist = collision_entry.min_dist
+                ce.link_bs = [link_b]
+                new_collision_goals.append(ce)
+        return new_collision_goals
 
     def robot_related_stuff(self, collision_goals):
-        i = 0
+        robot_name = self.robot.get_name()
         controlled_robot_links = self.robot.get_controlled_links()
-        while i < len(collision_goals):
-            collision_entry = collision_goals[i]
-            if self.is_avoid_all_self_collision(collision_entry):
-                i += 1
-                continue
-            if self.all_robot_links(collision_entry):
-                collision_goals.remove(collision_entry)
-
-                new_ces = []
-                for robot_link in controlled_robot_links:
-                    ce = CollisionEntry()
-                    ce.type = collision_entry.type
-                    ce.robot_links = [robot_link]
-                    ce.body_b = collision_entry.body_b
-                    ce.min_dist = collision_entry.min_dist
-                    ce.link_bs = collision_entry.link_bs
-                    new_ces.append(ce)
-
-                for new_ce in new_ces:
-                    collision_goals.insert(i, new_ce)
-                i += len(new_ces)
+        new_collision_goals = []
+        for collision_entry in collision_goals:
+            # same as is_avoid_all_self_collision, but all_robot_links is only evaluated once
+            all_robot_links = self.all_robot_links(collision_entry)
+            if all_robot_links and collision_entry.body_b == robot_name and self.is_avoid_collision(collision_entry) \
+                    and self.all_link_bs(collision_entry):
+                new_collision_goals.append(collision_entry)
                 continue
+            if all_robot_links:
+                robot_links = controlled_robot_links
             elif len(collision_entry.robot_links) > 1:
-                collision_goals.remove(collision_entry)
-                for robot_link in collision_entry.robot_links:
-                    ce = CollisionEntry()
-                    ce.type = collision_entry.type
-                    ce.robot_links = [robot_link]
-                    ce.body_b = collision_entry.body_b
-                    ce.min_dist = collision_entry.min_dist
-                    ce.link_bs = collision_entry.link_bs
-                    collision_goals.insert(i, ce)
-                i += len(collision_entry.robot_links)
+                robot_links = collision_entry.robot_links
+            else:
+                new_collision_goals.append(collision_entry)
                 continue
-            i += 1
-        return collision_goals
+            for robot_link in robot_links:
+                ce = CollisionEntry()
+                ce.type = collision_entry.type
+                ce.robot_links = [robot_link]
+                ce.body_b = collision_entry.body_b
+                ce.min_dist = collision_entry.min_dist
+                ce.link_bs = collision_entry.link_bs
+                new_collision_goals.append(ce)
+        return new_collision_goals
 
     def split_body_b(self, collision_goals):
-        i = 0
-        while i < len(collision_goals):
-            collision_entry = collision_goals[i]
+        body_bs = [self.robot.get_name()] + self.get_object_names()
+        new_collision_goals = []
+        for collision_entry in collision_goals:
             if self.all_body_bs(collision_entry):
-                collision_goals.remove(collision_entry)
-                new_ces = []
-                for body_b in [self.robot.get_name()] + self.get_object_names():
+                for body_b in body_bs:
                     ce = CollisionEntry()
                     ce.type = collision_entry.type
                     ce.robot_links = collision_entry.robot_links
                     ce.min_dist = collision_entry.min_dist
                     ce.body_b = body_b
                     ce.link_bs = collision_entry.link_bs
-                    new_ces.append(ce)
-                for new_ce in reversed(new_ces):
-                    collision_goals.insert(i, new_ce)
-                i += len(new_ces)
-                continue
-            i += 1
-        return collision_goals
+                    new_collision_goals.append(ce)
+            else:
+                new_collision_goals.append(collision_entry)
+        return new_collision_goals
 
     def all_robot_links(self, collision_entry):
-        return CollisionEntry.ALL in collision_entry.robot_links and len(collision_entry.robot_links) == 1
+        robot_links = collision_entry.robot_links
+        return len(robot_links) == 1 and robot_links[0] == CollisionEntry.ALL
 
     def all_link_bs(self, collision_entry):
-        return CollisionEntry.ALL in collision_entry.link_bs and len(collision_entry.link_bs) == 1 or \
-               not collision_entry.link_bs
+        link_bs = collision_entry.link_bs
+        return not link_bs or len(link_bs) == 1 and link_bs[0] == CollisionEntry.ALL
 
     def all_body_bs(self, collision_entry):
         return collision_entry.body_b == CollisionEntry.ALL
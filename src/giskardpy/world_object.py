@@ -78,7 +78,20 @@ class WorldObject(URDFObject):
     @controlled_joints.setter
     def controlled_joints(self, value):
         self._controlled_links = None
+        self._controlled_joints_set = None
         self._controlled_joints = value
+        # some memoized functions depend on the controlled joints
+        self.reset_cache()
+
+    def is_joint_controlled(self, joint_name):
+        """
+        :type joint_name: str
+        :return: joint_name in self.controlled_joints, but with a set lookup
+        :rtype: bool
+        """
+        if self._controlled_joints_set is None:
+            self._controlled_joints_set = set(self.controlled_joints)
+        return joint_name in self._controlled_joints_set
 
     def suicide(self):
         pass
@@ -92,7 +105,8 @@ class WorldObject(URDFObject):
 
     def get_controlled_links(self):
         # FIXME expensive
-        if not self._controlled_links:
+        # an empty set is a valid result, e.g. for objects without controlled joints, don't recompute it every time
+        if self._controlled_links is None:
             self._controlled_links = set()
             for joint_name in self.controlled_joints:
                 self._controlled_links.update(self.get_sub_tree_link_names_with_collision(joint_name))
@@ -196,13 +210,17 @@ class WorldObject(URDFObject):
         return self.generate_joint_state(f)
 
     def get_rnd_joint_state(self):
+        # one draw for all joints, consumed in the same sorted order as generate_joint_state iterates the joints,
+        # yields the same numbers as drawing them one by one
+        rnd = iter(np.random.random(len(self.get_movable_joints())).tolist())
+
         def f(joint_name):
             lower_limit, upper_limit = self.get_joint_limits(joint_name)
             if lower_limit is None:
-                return np.random.random() * np.pi * 2
+                return next(rnd) * np.pi * 2
             lower_limit = max(lower_limit, -10)
             upper_limit = min(upper_limit, 10)
-            return (np.random.random() * (upper_limit - lower_limit)) + lower_limit
+            return (next(rnd) * (upper_limit - lower_limit)) + lower_limit
 
         return self.generate_joint_state(f)
 
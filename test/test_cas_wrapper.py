@@ -16,6 +16,27 @@ from utils_for_tests import float_no_nan_no_inf, SMALL_NUMBER, unit_vector, quat
     pykdl_frame_to_numpy, lists_of_same_length, angle, compare_axis_angle, angle_positive, sq_matrix
 
 
+def rpy_from_matrix_stacked(matrix):
+    # roll, pitch and yaw in one matrix, such that they are compiled and evaluated together
+    return w.Matrix(w.rpy_from_matrix(matrix))
+
+
+def axis_angle_from_rpy_stacked(roll, pitch, yaw):
+    # axis and angle in one matrix, such that they are compiled and evaluated together
+    axis, angle = w.axis_angle_from_rpy(roll, pitch, yaw)
+    return w.Matrix([axis[0], axis[1], axis[2], angle])
+
+
+def compile_if_zero(if_zero):
+    """
+    :param if_zero: e.g. w.if_greater_zero
+    :return: compiled if_zero(condition, if_result, else_result), the samples of a batch are evaluated with one call
+    :rtype: w.CompiledFunction
+    """
+    symbols = [w.Symbol(u'condition'), w.Symbol(u'if_result'), w.Symbol(u'else_result')]
+    return w.speed_up(if_zero(*symbols), symbols)
+
+
 class TestCASWrapper(unittest.TestCase):
 
     #TODO test free symbols
@@ -78,12 +99,12 @@ class TestCASWrapper(unittest.TestCase):
         self.assertAlmostEqual(w.compile_and_execute(w.sign, [f1]),
                                np.sign(f1), places=7)
 
-    @given(float_no_nan_no_inf(),
-           float_no_nan_no_inf(),
-           float_no_nan_no_inf())
-    def test_if_greater_zero(self, condition, if_result, else_result):
-        self.assertAlmostEqual(w.compile_and_execute(w.if_greater_zero, [condition, if_result, else_result]),
-                               np.float(if_result if condition > 0 else else_result), places=7)
+    @given(lists_of_same_length([float_no_nan_no_inf(), float_no_nan_no_inf(), float_no_nan_no_inf()],
+                                max_length=100))
+    def test_if_greater_zero(self, samples):
+        condition, if_result, else_result = np.array(samples)
+        actual = compile_if_zero(w.if_greater_zero).call_batch(np.array(samples).T).ravel()
+        np.testing.assert_array_almost_equal(actual, np.where(condition > 0, if_result, else_result), decimal=7)
 
     @given(float_no_nan_no_inf(),
            float_no_nan_no_inf(),
@@ -110,13 +131,12 @@ class TestCASWrapper(unittest.TestCase):
             w.compile_and_execute(w.if_less_eq, [a, b, if_result, else_result]),
             np.float(if_result if a <= b else else_result), places=7)
 
-    @given(float_no_nan_no_inf(),
-           float_no_nan_no_inf(),
-           float_no_nan_no_inf())
-    def test_if_eq_zero(self, condition, if_result, else_result):
-        self.assertAlmostEqual(
-            w.compile_and_execute(w.if_eq_zero, [condition, if_result, else_result]),
-            np.float(if_result if condition == 0 else else_result), places=7)
+    @given(lists_of_same_length([float_no_nan_no_inf(), float_no_nan_no_inf(), float_no_nan_no_inf()],
+                                max_length=100))
+    def test_if_eq_zero(self, samples):
+        condition, if_result, else_result = np.array(samples)
+        actual = compile_if_zero(w.if_eq_zero).call_batch(np.array(samples).T).ravel()
+        np.testing.assert_array_almost_equal(actual, np.where(condition == 0, if_result, else_result), decimal=7)
 
     @given(float_no_nan_no_inf(),
            float_no_nan_no_inf(),
@@ -199,6 +219,14 @@ class TestCASWrapper(unittest.TestCase):
             w.compile_and_execute(w.cross, [u, v]),
             np.cross(u, v))
 
+    @given(vector(3),
+           vector(3))
+    def test_cross_vector3(self, u, v):
+        r = w.compile_and_execute(lambda a, b: w.cross(w.vector3(a[0], a[1], a[2]),
+                                                       w.vector3(b[0], b[1], b[2])), [u, v])
+        np.testing.assert_array_almost_equal(r[:3], np.cross(u, v))
+        self.assertEqual(r[3], 0)
+
     @given(vector(3))
     def test_vector3(self, v):
         r1 = w.vector3(*v)
@@ -375,10 +403,14 @@ class TestCASWrapper(unittest.TestCase):
         self.assertTrue(f[0,3], 2)
         self.assertTrue(f[0,3], 3)
 
-    @given(unit_vector(4))
-    def test_trace(self, q):
-        m = quaternion_matrix(q)
-        np.testing.assert_array_almost_equal(w.compile_and_execute(w.trace, [m]), np.trace(m))
+    @given(st.lists(unit_vector(4), min_size=1, max_size=50))
+    def test_trace(self, qs):
+        ms = np.array([quaternion_matrix(q) for q in qs])
+        symbols = [w.Symbol(u'm{}{}'.format(i, j)) for i in range(4) for j in range(4)]
+        # compiled once and evaluated for all matrices with one call
+        fast_trace = w.speed_up(w.trace(w.Matrix([symbols[i * 4:i * 4 + 4] for i in range(4)])), symbols)
+        np.testing.assert_array_almost_equal(fast_trace.call_batch(ms.reshape(len(ms), 16)).ravel(),
+                                             np.einsum(u'nii->n', ms))
 
 
     @given(quaternion(),
@@ -424,8 +456,8 @@ class TestCASWrapper(unittest.TestCase):
            angle())
     def test_axis_angle_from_rpy(self, roll, pitch, yaw):
         angle2, axis2, _ = rotation_from_matrix(euler_matrix(roll, pitch, yaw))
-        axis = w.compile_and_execute(lambda r, p, y: w.axis_angle_from_rpy(r, p, y)[0], [roll, pitch, yaw])
-        angle = w.compile_and_execute(lambda r, p, y: w.axis_angle_from_rpy(r, p, y)[1], [roll, pitch, yaw])
+        axis_angle = w.compile_and_execute(axis_angle_from_rpy_stacked, [roll, pitch, yaw])
+        axis, angle = axis_angle[:3], axis_angle[3]
         if angle < 0:
             angle = -angle
             axis = [-x for x in axis]
@@ -451,9 +483,7 @@ class TestCASWrapper(unittest.TestCase):
     @given(unit_vector(4))
     def test_rpy_from_matrix(self, q):
         matrix = quaternion_matrix(q)
-        roll = w.compile_and_execute(lambda m: w.rpy_from_matrix(m)[0], [matrix])
-        pitch = w.compile_and_execute(lambda m: w.rpy_from_matrix(m)[1], [matrix])
-        yaw = w.compile_and_execute(lambda m: w.rpy_from_matrix(m)[2], [matrix])
+        roll, pitch, yaw = w.compile_and_execute(rpy_from_matrix_stacked, [matrix])
         roll2, pitch2, yaw2 = euler_from_matrix(matrix)
         self.assertTrue(np.isclose(roll, roll2), msg='{} != {}'.format(roll, roll2))
         self.assertTrue(np.isclose(pitch, pitch2), msg='{} != {}'.format(pitch, pitch2))
@@ -462,9 +492,7 @@ class TestCASWrapper(unittest.TestCase):
     @given(unit_vector(4))
     def test_rpy_from_matrix2(self, q):
         matrix = quaternion_matrix(q)
-        roll = w.compile_and_execute(lambda m: w.rpy_from_matrix(m)[0], [matrix])
-        pitch = w.compile_and_execute(lambda m: w.rpy_from_matrix(m)[1], [matrix])
-        yaw = w.compile_and_execute(lambda m: w.rpy_from_matrix(m)[2], [matrix])
+        roll, pitch, yaw = w.compile_and_execute(rpy_from_matrix_stacked, [matrix])
         r1 = w.compile_and_execute(w.rotation_matrix_from_rpy, [roll, pitch, yaw])
         self.assertTrue(np.isclose(r1, matrix).all(), msg='{} != {}'.format(r1, matrix))
 
@@ -483,6 +511,13 @@ class TestCASWrapper(unittest.TestCase):
         q1_2 = w.compile_and_execute(w.quaternion_from_matrix, [matrix])
         self.assertTrue(np.isclose(q1_2, q2).all() or np.isclose(q1_2, -q2).all(), msg='{} != {}'.format(q, q1_2))
 
+    @given(quaternion())
+    def test_quaternion_from_matrix_shepperd(self, q):
+        matrix = quaternion_matrix(q)
+        q2 = quaternion_from_matrix(matrix)
+        q1_2 = w.compile_and_execute(w.quaternion_from_matrix_shepperd, [matrix])
+        self.assertTrue(np.isclose(q1_2, q2).all() or np.isclose(q1_2, -q2).all(), msg='{} != {}'.format(q, q1_2))
+
     @given(quaternion(),
            quaternion())
     def test_quaternion_multiply(self, q, p):
@@ -490,11 +525,13 @@ class TestCASWrapper(unittest.TestCase):
         r2 = quaternion_multiply(q, p)
         self.assertTrue(np.isclose(r1, r2).all() or np.isclose(r1, -r2).all(), msg='{} != {}'.format(r1, r2))
 
-    @given(quaternion())
-    def test_quaternion_conjugate(self, q):
-        r1 = w.compile_and_execute(w.quaternion_conjugate, [q])
-        r2 = quaternion_conjugate(q)
-        self.assertTrue(np.isclose(r1, r2).all() or np.isclose(r1, -r2).all(), msg='{} != {}'.format(r1, r2))
+    @given(st.lists(quaternion(), min_size=1, max_size=50))
+    def test_quaternion_conjugate(self, qs):
+        qs = np.array(qs)
+        symbols = [w.Symbol(u'q{}'.format(i)) for i in range(4)]
+        # compiled once and evaluated for all quaternions with one call
+        fast_conjugate = w.speed_up(w.quaternion_conjugate(w.Matrix(symbols)), symbols)
+        np.testing.assert_array_almost_equal(fast_conjugate.call_batch(qs)[:, :, 0], qs * [-1, -1, -1, 1])
 
     @given(quaternion(),
            quaternion())
@@ -503,6 +540,13 @@ class TestCASWrapper(unittest.TestCase):
         q4 = w.compile_and_execute(w.quaternion_diff, [q1, q2])
         self.assertTrue(np.isclose(q3, q4).all() or np.isclose(q3, -q4).all(), msg='{} != {}'.format(q1, q4))
 
+    @given(quaternion(),
+           unit_vector(3))
+    def test_quaternion_rotate_vector(self, q, v):
+        r1 = w.compile_and_execute(w.quaternion_rotate_vector, [q, v])
+        r2 = quaternion_matrix(q)[:3, :3].dot(v)
+        np.testing.assert_array_almost_equal(r1, r2)
+
     # @given(lists_of_same_length([float_no_nan_no_inf(), float_no_nan_no_inf()],
     #                             min_length=2, max_length=50))
     # FIXME there appears to be a bug in scipy cosine, when values are very large, that my implementation doesn't have
@@ -512,15 +556,23 @@ class TestCASWrapper(unittest.TestCase):
     #     actual = w.compile_and_execute(w.cosine_distance, [v1, v2])
     #     self.assertTrue(np.isclose(expected, actual, atol=1e-6, equal_nan=True))
 
-    @given(quaternion(),
-           quaternion(),
-           st.floats(allow_nan=False, allow_infinity=False, min_value=0, max_value=1))
-    def test_slerp(self, q1, q2, t):
-        r1 = w.compile_and_execute(w.quaternion_slerp, [q1, q2, t])
-        r2 = quaternion_slerp(q1, q2, t)
-        self.assertTrue(np.isclose(r1, r2, atol=1e-3).all() or
-                        np.isclose(r1, -r2, atol=1e-3).all(),
-                        msg='q1={} q2={} t={}\n{} != {}'.format(q1, q2, t, r1, r2))
+    @given(st.lists(st.tuples(quaternion(),
+                              quaternion(),
+                              st.floats(allow_nan=False, allow_infinity=False, min_value=0, max_value=1)),
+                    min_size=1, max_size=50))
+    def test_slerp(self, samples):
+        q1_symbols = [w.Symbol(u'q1_{}'.format(i)) for i in range(4)]
+        q2_symbols = [w.Symbol(u'q2_{}'.format(i)) for i in range(4)]
+        t_symbol = w.Symbol(u't')
+        # compiled once and evaluated for all samples with one call
+        fast_slerp = w.speed_up(w.quaternion_slerp(w.Matrix(q1_symbols), w.Matrix(q2_symbols), t_symbol),
+                                q1_symbols + q2_symbols + [t_symbol])
+        args = np.array([np.concatenate((q1, q2, [t])) for q1, q2, t in samples])
+        for (q1, q2, t), r1 in zip(samples, fast_slerp.call_batch(args)[:, :, 0]):
+            r2 = quaternion_slerp(q1, q2, t)
+            self.assertTrue(np.isclose(r1, r2, atol=1e-3).all() or
+                            np.isclose(r1, -r2, atol=1e-3).all(),
+                            msg='q1={} q2={} t={}\n{} != {}'.format(q1, q2, t, r1, r2))
 
     # fails if numbers too big or too small
     @given(unit_vector(3),
@@ -10,7 +10,7 @@ from geometry_msgs.msg import PoseStamped
 from hypothesis import given, assume
 import hypothesis.strategies as st
 from giskardpy import identifier
-from giskardpy import cas_wrapper as w
+from giskardpy import casadi_wrapper as w
 from giskardpy.god_map import GodMap
 from utils_for_tests import variable_name, keys_values, lists_of_same_length, pr2_urdf
 from giskardpy.world import World
@@ -305,6 +305,20 @@ class TestGodMap(unittest.TestCase):
             gm.to_symbol([key])
         self.assertEqual(len(gm.get_values(keys)), len(keys))
 
+    @given(lists_of_same_length([variable_name(), st.floats(allow_nan=False)], unique=True))
+    def test_make_values_getter(self, keys_values):
+        keys, values = keys_values
+        gm = GodMap()
+        for key, value in zip(keys, values):
+            gm.set_data([key], value)
+            gm.to_symbol([key])
+        get_values = gm.make_values_getter(keys)
+        self.assertEqual(get_values(), gm.get_values(keys))
+        new_values = [value + 1 for value in values]
+        for key, value in zip(keys, new_values):
+            gm.set_data([key], value)
+        self.assertEqual(get_values(), new_values)
+
     def test_god_map_with_world(self):
         gm = GodMap()
         w = World()
@@ -13,7 +13,8 @@ import pytest
 from urdf_parser_py.urdf import URDF
 
 from giskardpy.robot import Robot
-from utils_for_tests import rnd_joint_state, pr2_urdf, donbot_urdf, boxy_urdf, base_bot_urdf, compare_poses
+from utils_for_tests import rnd_joint_state, pr2_urdf, donbot_urdf, boxy_urdf, base_bot_urdf, compare_poses, \
+    pykdl_frame_to_numpy
 from giskardpy.urdf_object import hacky_urdf_parser_fix
 from kdl_parser import kdl_tree_from_urdf_model
 import numpy as np
@@ -116,19 +117,11 @@ class KDL(object):
 
         def fk_np(self, js_dict):
             f = self.fk(js_dict)
-            r = [[f.M[0, 0], f.M[0, 1], f.M[0, 2], f.p[0]],
-                 [f.M[1, 0], f.M[1, 1], f.M[1, 2], f.p[1]],
-                 [f.M[2, 0], f.M[2, 1], f.M[2, 2], f.p[2]],
-                 [0, 0, 0, 1], ]
-            return np.array(r)
+            return pykdl_frame_to_numpy(f)
 
         def fk_np_inv(self, js_dict):
             f = self.fk(js_dict).Inverse()
-            r = [[f.M[0, 0], f.M[0, 1], f.M[0, 2], f.p[0]],
-                 [f.M[1, 0], f.M[1, 1], f.M[1, 2], f.p[1]],
-                 [f.M[2, 0], f.M[2, 1], f.M[2, 2], f.p[2]],
-                 [0, 0, 0, 1], ]
-            return np.array(r)
+            return pykdl_frame_to_numpy(f)
 
     def __init__(self, urdf):
         if urdf.endswith(u'.urdfs'):
@@ -214,6 +207,16 @@ class TestSymengineController(object):
             symengine_fk = parsed_boxy.get_fk_pose(root, tip).pose
             compare_poses(kdl_fk, symengine_fk)
 
+    def test_donbot_fk_batch(self, parsed_donbot):
+        root = u'base_footprint'
+        tip = u'gripper_tool_frame'
+        joint_states = [parsed_donbot.get_rnd_joint_state() for _ in range(5)]
+        fks = parsed_donbot.get_fk_np_batch(root, tip, joint_states)
+        assert fks.shape == (5, 4, 4)
+        for joint_state, fk in zip(joint_states, fks):
+            parsed_donbot.joint_state = joint_state
+            np.testing.assert_array_almost_equal(parsed_donbot.get_fk_np(root, tip), fk)
+
 
     def test_get_controllable_joint_names_pr2(self, parsed_pr2):
         expected = {u'l_shoulder_pan_joint', u'br_caster_l_wheel_joint', u'r_gripper_l_finger_tip_joint',
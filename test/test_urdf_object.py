@@ -6,6 +6,23 @@ from giskardpy.urdf_object import URDFObject
 from giskardpy.utils import make_world_body_box, make_world_body_sphere, make_world_body_cylinder, make_urdf_world_body
 from utils_for_tests import pr2_urdf, donbot_urdf, boxy_urdf, base_bot_urdf
 
+
+def fixed_joints_below_movable_joint_urdf(l_collision):
+    """
+    root -prismatic-> g -fixed-> p -fixed-> l
+    """
+    return u'<robot name="muh">' \
+           u'<link name="root"/>' \
+           u'<link name="g"/>' \
+           u'<link name="p"/>' \
+           u'<link name="l">{}</link>' \
+           u'<joint name="root_g" type="prismatic"><parent link="root"/><child link="g"/><axis xyz="1 0 0"/>' \
+           u'<limit effort="1" lower="-1" upper="1" velocity="1"/></joint>' \
+           u'<joint name="g_p" type="fixed"><parent link="g"/><child link="p"/></joint>' \
+           u'<joint name="p_l" type="fixed"><parent link="p"/><child link="l"/></joint>' \
+           u'</robot>'.format(l_collision)
+
+
 set_of_pr2_joints = {'r_gripper_motor_accelerometer_joint',
                      'high_def_optical_frame_joint',
                      'r_gripper_palm_joint',
@@ -249,6 +266,16 @@ class TestUrdfObject(object):
         assert len(parsed_pr2.get_link_names()) == 1
         assert parsed_pr2.get_name() == u'ball'
 
+    def test_reset_cache_of_one_object(self, function_setup):
+        parsed_pr2 = self.cls(pr2_urdf())
+        parsed_donbot = self.cls(donbot_urdf())
+        pr2_links = parsed_pr2.get_link_names()
+        donbot_links = parsed_donbot.get_link_names()
+        parsed_pr2.reset_cache()
+        assert parsed_donbot.get_link_names() is donbot_links
+        assert parsed_pr2.get_link_names() is not pr2_links
+        assert set(parsed_pr2.get_link_names()) == set_of_pr2_links
+
     def test_from_world_body_box(self, function_setup):
         wb = make_world_body_box()
         urdf_obj = self.cls.from_world_body(wb)
@@ -468,6 +495,16 @@ class TestUrdfObject(object):
                                                    'wide_stereo_r_stereo_camera_frame_joint',
                                                    'wide_stereo_r_stereo_camera_optical_frame_joint'}
 
+    def test_get_joints_and_links_from_sub_tree(self, function_setup):
+        parsed_pr2 = self.cls(pr2_urdf())
+        joints, links = parsed_pr2.get_joints_and_links_from_sub_tree(u'torso_lift_joint')
+        urdf_obj = parsed_pr2.get_sub_tree_at_joint(u'torso_lift_joint')
+        assert joints[0] == u'torso_lift_joint'
+        assert len(joints) == len(links)
+        assert set(links) == set(urdf_obj.get_link_names())
+        assert set(links) == set(parsed_pr2.get_links_from_sub_tree(u'torso_lift_joint'))
+        assert set(joints[1:]).issubset(set(urdf_obj.get_joint_names()))
+
     def test_attach_urdf_object1(self, function_setup):
         parsed_pr2 = self.cls(pr2_urdf())
         num_of_links_before = len(parsed_pr2.get_link_names())
@@ -1402,3 +1439,11 @@ class TestUrdfObject(object):
     def test_get_non_base_movement_root2(self, function_setup):
         parsed_pr2 = self.cls(pr2_urdf())
         assert parsed_pr2.get_non_base_movement_root() == u'base_footprint'
+
+    def test_get_non_base_movement_root3(self, function_setup):
+        urdf = fixed_joints_below_movable_joint_urdf(u'<collision><geometry><box size="1 1 1"/></geometry></collision>')
+        assert self.cls(urdf).get_non_base_movement_root() == u'g'
+
+    def test_get_non_base_movement_root4(self, function_setup):
+        urdf = fixed_joints_below_movable_joint_urdf(u'')
+        assert self.cls(urdf).get_non_base_movement_root() == u'g'
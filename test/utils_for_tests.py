@@ -214,9 +214,11 @@ def quaternion(elements=None):
 
 
 def pykdl_frame_to_numpy(pykdl_frame):
-    return np.array([[pykdl_frame.M[0, 0], pykdl_frame.M[0, 1], pykdl_frame.M[0, 2], pykdl_frame.p[0]],
-                     [pykdl_frame.M[1, 0], pykdl_frame.M[1, 1], pykdl_frame.M[1, 2], pykdl_frame.p[1]],
-                     [pykdl_frame.M[2, 0], pykdl_frame.M[2, 1], pykdl_frame.M[2, 2], pykdl_frame.p[2]],
+    M = pykdl_frame.M
+    p = pykdl_frame.p
+    return np.array([[M[0, 0], M[0, 1], M[0, 2], p[0]],
+                     [M[1, 0], M[1, 1], M[1, 2], p[1]],
+                     [M[2, 0], M[2, 1], M[2, 2], p[2]],
                      [0, 0, 0, 1]])
 
 